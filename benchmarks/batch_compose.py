@@ -0,0 +1,85 @@
+"""
+批量合成性能测试
+
+比较逐个格子调用 compose_cell（PIL）与 compose_cells 向量化合成（NumPy）的耗时，
+只测合成阶段，壁纸图层预先生成
+
+用法:
+    python benchmarks/batch_compose.py --batch-sizes 1 4 16 64
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+import image_processor
+from image_processor import ImageProcessor
+
+
+def generate_layers(processor, count):
+    """
+    生成合成用的壁纸图层
+    
+    @param processor: ImageProcessor 实例
+    @param count: 图层数量
+    @return: 393x852 RGB 图层列表
+    """
+    size = (processor.TARGET_WIDTH, processor.TARGET_HEIGHT)
+    return [
+        Image.effect_mandelbrot(size, (-2.0, -1.5, 1.0, 1.5), 30 + idx).convert("RGB")
+        for idx in range(count)
+    ]
+
+
+def time_compose(processor, layers, use_numpy, repeat):
+    """
+    测量合成一批图层的耗时
+    
+    @param processor: ImageProcessor 实例
+    @param layers: 壁纸图层列表
+    @param use_numpy: 是否使用 NumPy 向量化合成
+    @param repeat: 重复次数，取最快一次
+    @return: 每个格子的平均耗时（毫秒）
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processor.compose_cells(layers, use_numpy=use_numpy)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(layers) * 1000
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量合成性能测试")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--background", default="#000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    template_path = os.path.join(ROOT_DIR, "assets", "templates", "phone-holder.png")
+    processor = ImageProcessor(template_path, args.background)
+    layers = generate_layers(processor, max(args.batch_sizes))
+    
+    if image_processor.np is None:
+        print("未安装 NumPy，只测试 PIL 合成")
+    print(f"{'批大小':>6} {'PIL(毫秒/格)':>14} {'NumPy(毫秒/格)':>16} {'加速比':>8}")
+    
+    for batch_size in args.batch_sizes:
+        batch = layers[:batch_size]
+        pil_time = time_compose(processor, batch, False, args.repeat)
+        if image_processor.np is None:
+            print(f"{batch_size:>6} {pil_time:>14.2f} {'-':>16} {'-':>8}")
+            continue
+        numpy_time = time_compose(processor, batch, True, args.repeat)
+        print(f"{batch_size:>6} {pil_time:>14.2f} {numpy_time:>16.2f} {pil_time / numpy_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+网格并行处理加速比测试
+
+生成合成测试图片，分别使用 1 到 N 个线程处理同一个网格，输出耗时和加速比
+
+用法:
+    python benchmarks/parallel_speedup.py --rows 3 --cols 3 --max-workers 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from image_processor import ImageProcessor
+
+
+def generate_inputs(folder, count, size):
+    """
+    生成合成 JPEG 测试图片
+    
+    @param folder: 输出文件夹
+    @param count: 图片数量
+    @param size: 图片尺寸 (宽, 高)
+    @return: 图片路径列表
+    """
+    paths = []
+    for idx in range(count):
+        path = os.path.join(folder, f"input_{idx:03d}.jpg")
+        image = Image.effect_mandelbrot(size, (-2.0, -1.5, 1.0, 1.5), 30 + idx).convert("RGB")
+        image.save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="网格并行处理加速比测试")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    template_path = os.path.join(ROOT_DIR, "assets", "templates", "phone-holder.png")
+    processor = ImageProcessor(template_path)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        paths = generate_inputs(folder, args.rows * args.cols, (args.width, args.height))
+        
+        print(f"CPU 核心数: {os.cpu_count()}, 网格: {args.rows}x{args.cols}, "
+              f"输入: {args.width}x{args.height}")
+        print(f"{'线程数':>6} {'耗时(秒)':>10} {'加速比':>8}")
+        
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cells = processor.process_batch(paths, max_workers=workers)
+                processor.create_grid_layout(cells, args.rows, args.cols)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            if baseline is None:
+                baseline = best
+            print(f"{workers:>6} {best:>10.3f} {baseline / best:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
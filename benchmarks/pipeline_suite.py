@@ -0,0 +1,396 @@
+"""
+图片处理流程基准测试套件
+
+生成不同分辨率、宽高比和格式的合成测试图片，分别测量 ImageProcessor 各公开方法和
+1x1 到 10x10 网格的耗时、吞吐量和峰值内存，结果写入 JSON 文件，可与之前版本的结果对比。
+每个测试用例在独立子进程中运行，峰值内存互不影响；当前版本缺少被测方法的用例记录为跳过
+
+用法:
+    python benchmarks/pipeline_suite.py --output results.json
+    python benchmarks/pipeline_suite.py --quick --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PIL
+from PIL import Image, ImageChops
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from image_processor import ImageProcessor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TEMPLATE_PATH = os.path.join(ROOT_DIR, "assets", "templates", "phone-holder.png")
+RESULT_VERSION = 1
+
+# 各测试方法依赖的 ImageProcessor 方法，旧版本缺少时跳过该用例而不是报错，
+# 以便在旧版本上也能生成可供 --compare 对比的结果
+CASE_REQUIREMENTS = {
+    "open_wallpaper": ("open_wallpaper",),
+    "render_layer": ("render_layer",),
+    "process_wallpaper": ("process_wallpaper",),
+    "compose_cell": ("render_layer", "compose_cell"),
+    "create_grid_layout": ("process_wallpaper", "create_grid_layout"),
+    "save_result": ("process_wallpaper", "create_grid_layout", "save_result"),
+    "grid_end_to_end": ("process_wallpaper", "create_grid_layout", "save_result"),
+    "save_grid_streaming": ("save_grid_streaming",),
+}
+
+
+def parse_aspect(value):
+    """
+    解析宽高比参数
+    
+    @param value: 宽高比字符串，如 "16:9"
+    @return: (宽, 高) 元组
+    """
+    try:
+        width, height = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的宽高比: {value}，应为 宽:高，如 16:9")
+    return width, height
+
+
+def parse_layout(value):
+    """
+    解析网格布局参数
+    
+    @param value: 布局字符串，如 "3x3"
+    @return: (行数, 列数) 元组
+    """
+    try:
+        rows, cols = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的布局: {value}，应为 行x列，如 3x3")
+    return rows, cols
+
+
+def input_size(megapixels, aspect):
+    """
+    计算给定像素数和宽高比的图片尺寸
+    
+    @param megapixels: 百万像素数
+    @param aspect: (宽, 高) 比例
+    @return: (宽, 高) 元组
+    """
+    height = (megapixels * 1000000 * aspect[1] / aspect[0]) ** 0.5
+    return int(height * aspect[0] / aspect[1]), int(height)
+
+
+def generate_input(folder, megapixels, aspect, image_format):
+    """
+    生成一张确定性的合成测试图片
+    
+    用小尺寸分形图放大后叠加渐变，既有细节又能快速生成超大尺寸
+    
+    @param folder: 输出文件夹
+    @param megapixels: 百万像素数
+    @param aspect: (宽, 高) 比例
+    @param image_format: "JPEG" 或 "PNG"
+    @return: 图片路径
+    """
+    size = input_size(megapixels, aspect)
+    base = Image.effect_mandelbrot((512, 512), (-2.0, -1.5, 1.0, 1.5), 64)
+    detail = ImageChops.add(base.resize(size, Image.Resampling.BILINEAR), Image.linear_gradient("L").resize(size))
+    image = Image.merge("RGB", (detail, base.resize(size, Image.Resampling.NEAREST), Image.radial_gradient("L").resize(size)))
+    ext = "jpg" if image_format == "JPEG" else "png"
+    path = os.path.join(folder, f"input_{megapixels}mp_{aspect[0]}x{aspect[1]}.{ext}")
+    if image_format == "JPEG":
+        image.save(path, format="JPEG", quality=90)
+    else:
+        image.save(path, format="PNG", compress_level=1)
+    return path
+
+
+def peak_rss_mb():
+    """
+    获取当前进程的峰值常驻内存
+    
+    Linux 上读取 /proc/self/status 中的 VmHWM：ru_maxrss 会跨 exec 保留父进程的峰值，
+    子进程中读到的可能是生成测试图片时主进程的内存
+    
+    @return: 峰值内存（MB），平台不支持时返回 None
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def time_call(func, repeat):
+    """
+    重复调用并计时
+    
+    @param func: 无参数的可调用对象
+    @param repeat: 重复次数
+    @return: 每次耗时（秒）列表
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def missing_methods(processor, method):
+    """
+    检查测试方法依赖的 ImageProcessor 方法是否存在
+    
+    @param processor: ImageProcessor 对象
+    @param method: 测试方法名
+    @return: 缺少的方法名列表
+    """
+    if method not in CASE_REQUIREMENTS:
+        raise ValueError(f"未知的测试方法: {method}")
+    return [name for name in CASE_REQUIREMENTS[method] if not hasattr(processor, name)]
+
+
+def process_cells(processor, paths):
+    """
+    处理全部格子，旧版本没有 process_batch 时逐张调用 process_wallpaper
+    
+    @param processor: ImageProcessor 对象
+    @param paths: 壁纸图片路径列表
+    @return: 处理后的格子图片列表
+    """
+    if hasattr(processor, "process_batch"):
+        return processor.process_batch(paths)
+    return [processor.process_wallpaper(path) for path in paths]
+
+
+def run_case(case, repeat, scratch_dir):
+    """
+    在子进程中运行一个测试用例
+    
+    @param case: 用例描述字典，method 为被测方法名
+    @param repeat: 重复次数
+    @param scratch_dir: 保存输出文件的临时文件夹
+    @return: 含耗时、吞吐量和峰值内存的结果字典；当前版本缺少被测方法时为 {"skipped": 原因}
+    """
+    processor = ImageProcessor(TEMPLATE_PATH)
+    baseline_rss = peak_rss_mb()
+    method = case["method"]
+    paths = case["paths"]
+    rows, cols = case.get("layout", (1, 1))
+    save_format = case.get("format", "PNG")
+    output_path = os.path.join(scratch_dir, f"out_{os.getpid()}.{save_format.lower()}")
+    
+    missing = missing_methods(processor, method)
+    if missing:
+        return {"skipped": f"ImageProcessor 缺少 {', '.join(missing)}"}
+    
+    if method == "open_wallpaper":
+        func = lambda: processor.open_wallpaper(paths[0])
+    elif method == "render_layer":
+        func = lambda: processor.render_layer(paths[0])
+    elif method == "process_wallpaper":
+        func = lambda: processor.process_wallpaper(paths[0])
+    elif method == "compose_cell":
+        layer = processor.render_layer(paths[0])
+        func = lambda: processor.compose_cell(layer)
+    elif method == "create_grid_layout":
+        cells = process_cells(processor, paths)
+        func = lambda: processor.create_grid_layout(cells, rows, cols)
+    elif method == "save_result":
+        sheet = processor.create_grid_layout(process_cells(processor, paths), rows, cols)
+        func = lambda: processor.save_result(sheet, output_path, save_format)
+    elif method == "grid_end_to_end":
+        func = lambda: processor.save_result(
+            processor.create_grid_layout(process_cells(processor, paths), rows, cols),
+            output_path, save_format
+        )
+    elif method == "save_grid_streaming":
+        func = lambda: processor.save_grid_streaming(paths, rows, cols, output_path, save_format)
+    
+    timings = time_call(func, repeat)
+    best = min(timings)
+    result = {
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "timings_s": timings,
+        "cells_per_s": len(paths) / best if best > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+    }
+    if os.path.exists(output_path):
+        result["output_bytes"] = os.path.getsize(output_path)
+        os.remove(output_path)
+    return result
+
+
+def build_cases(args, inputs):
+    """
+    生成全部测试用例
+    
+    @param args: 命令行参数
+    @param inputs: {(百万像素, 宽高比, 格式): 图片路径} 字典
+    @return: 用例字典列表
+    """
+    cases = []
+    for (megapixels, aspect, image_format), path in inputs.items():
+        if image_format not in args.formats:
+            continue
+        for method in ("open_wallpaper", "render_layer", "process_wallpaper"):
+            cases.append({
+                "name": f"{method}/{image_format}/{megapixels}mp/{aspect[0]}:{aspect[1]}",
+                "method": method,
+                "paths": [path],
+                "megapixels": megapixels,
+            })
+    
+    grid_input = inputs[(args.grid_megapixels, args.aspects[0], "JPEG")]
+    cases.append({"name": "compose_cell", "method": "compose_cell", "paths": [grid_input]})
+    for rows, cols in args.layouts:
+        paths = [grid_input] * (rows * cols)
+        layout = f"{rows}x{cols}"
+        cases.append({"name": f"create_grid_layout/{layout}", "method": "create_grid_layout",
+                      "paths": paths, "layout": (rows, cols)})
+        for save_format in ("PNG", "JPG"):
+            for method in ("save_result", "grid_end_to_end", "save_grid_streaming"):
+                cases.append({"name": f"{method}/{save_format}/{layout}", "method": method,
+                              "paths": paths, "layout": (rows, cols), "format": save_format})
+    return cases
+
+
+def git_revision():
+    """
+    获取当前代码的 git 提交号
+    
+    @return: 提交号字符串，不在 git 仓库中时返回 None
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline_path):
+    """
+    打印与基准结果的对比
+    
+    @param results: 本次结果字典
+    @param baseline_path: 之前保存的结果 JSON 路径
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {case["name"]: case for case in json.load(f)["cases"]}
+    
+    print(f"\n与 {baseline_path} 对比（耗时比 < 1 表示变快）")
+    print(f"{'用例':<44} {'旧(秒)':>8} {'新(秒)':>8} {'耗时比':>7} {'内存变化(MB)':>10}")
+    for case in results["cases"]:
+        old = baseline.get(case["name"])
+        if old is None or "skipped" in old or "skipped" in case:
+            continue
+        ratio = case["best_s"] / old["best_s"] if old["best_s"] else float("nan")
+        rss_delta = ""
+        if case.get("peak_rss_mb") is not None and old.get("peak_rss_mb") is not None:
+            rss_delta = f"{case['peak_rss_mb'] - old['peak_rss_mb']:+.0f}"
+        print(f"{case['name']:<46} {old['best_s']:>10.3f} {case['best_s']:>10.3f} {ratio:>10.2f} {rss_delta:>14}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="图片处理流程基准测试套件")
+    parser.add_argument("--megapixels", type=int, nargs="+", default=[1, 4, 12, 24, 50],
+                        help="输入图片的百万像素数")
+    parser.add_argument("--aspects", type=parse_aspect, nargs="+", default=[(4, 3), (16, 9), (9, 16)],
+                        help="输入图片宽高比，如 4:3 16:9")
+    parser.add_argument("--formats", type=str.upper, nargs="+", choices=["JPEG", "PNG"], default=["JPEG", "PNG"],
+                        help="输入图片格式")
+    parser.add_argument("--layouts", type=parse_layout, nargs="+",
+                        default=[(1, 1), (2, 2), (3, 3), (5, 5), (10, 10)], help="网格布局")
+    parser.add_argument("--grid-megapixels", type=int, default=12, help="网格用例使用的输入图片百万像素数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个单图用例的重复次数")
+    parser.add_argument("--grid-repeat", type=int, default=1, help="每个网格用例的重复次数")
+    parser.add_argument("--quick", action="store_true", help="快速模式：1/12 MP、4:3、JPEG、1x1 和 3x3")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果 JSON 文件路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args()
+    
+    if args.quick:
+        args.megapixels = [1, 12]
+        args.aspects = [(4, 3)]
+        args.formats = ["JPEG"]
+        args.layouts = [(1, 1), (3, 3)]
+    if args.grid_megapixels not in args.megapixels:
+        args.megapixels.append(args.grid_megapixels)
+    
+    results = {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cases": [],
+    }
+    
+    with tempfile.TemporaryDirectory() as folder:
+        # 网格用例固定使用 JPEG 输入，即使未选择 JPEG 格式也要生成
+        inputs = {}
+        for megapixels in args.megapixels:
+            for aspect in args.aspects:
+                for image_format in ("JPEG", "PNG"):
+                    key = (megapixels, aspect, image_format)
+                    if image_format in args.formats or key == (args.grid_megapixels, args.aspects[0], "JPEG"):
+                        inputs[key] = generate_input(folder, megapixels, aspect, image_format)
+        cases = build_cases(args, inputs)
+        
+        print(f"CPU 核心数: {os.cpu_count()}, Pillow {PIL.__version__}, 共 {len(cases)} 个用例")
+        print(f"{'用例':<44} {'最快(秒)':>8} {'格/秒':>7} {'峰值内存(MB)':>10}")
+        
+        # 每个用例使用全新的子进程，峰值内存 (VmHWM) 只反映该用例
+        context = multiprocessing.get_context("spawn")
+        for case in cases:
+            repeat = args.repeat if len(case["paths"]) == 1 else args.grid_repeat
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measured = executor.submit(run_case, case, repeat, folder).result()
+            entry = {key: value for key, value in case.items() if key != "paths"}
+            entry["cells"] = len(case["paths"])
+            entry["repeat"] = repeat
+            entry.update(measured)
+            results["cases"].append(entry)
+            
+            if "skipped" in measured:
+                print(f"{case['name']:<46} 跳过: {measured['skipped']}", flush=True)
+                continue
+            rss = f"{measured['peak_rss_mb']:.0f}" if measured["peak_rss_mb"] is not None else "-"
+            print(f"{case['name']:<46} {measured['best_s']:>10.3f} {measured['cells_per_s']:>9.2f} {rss:>14}",
+                  flush=True)
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+    
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
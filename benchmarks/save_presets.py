@@ -0,0 +1,69 @@
+"""
+保存预设编码耗时与文件大小对比
+
+用合成测试图片拼出一张网格，分别以各保存预设编码为 PNG、JPG 和 WebP，输出编码耗时和文件大小
+
+用法:
+    python benchmarks/save_presets.py --rows 3 --cols 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from image_processor import ImageProcessor
+from parallel_speedup import generate_inputs
+from stage_timer import format_row
+
+COLUMN_WIDTHS = (6, 10, 11, 14, 12)
+COLUMN_ALIGNS = "<<<>>"
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="保存预设编码耗时与文件大小对比")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    template_path = os.path.join(ROOT_DIR, "assets", "templates", "phone-holder.png")
+    processor = ImageProcessor(template_path)
+    
+    with tempfile.TemporaryDirectory() as folder:
+        paths = generate_inputs(folder, args.rows * args.cols, (args.width, args.height))
+        sheet = processor.create_grid_layout(processor.process_batch(paths), args.rows, args.cols)
+        
+        print(f"网格: {args.rows}x{args.cols} ({sheet.width}x{sheet.height})，JPG/WebP 质量 {args.quality}")
+        print(format_row(("格式", "预设", "调色板/无损", "编码耗时(毫秒)", "文件大小(KB)"), COLUMN_WIDTHS, COLUMN_ALIGNS))
+        
+        variants = [("PNG", preset, False) for preset in processor.SAVE_PRESETS]
+        variants += [("PNG", preset, True) for preset in processor.SAVE_PRESETS]
+        variants += [("JPG", preset, False) for preset in processor.SAVE_PRESETS]
+        variants += [("WEBP", preset, False) for preset in processor.SAVE_PRESETS]
+        variants += [("WEBP", preset, True) for preset in processor.SAVE_PRESETS]
+        for save_format, preset, flag in variants:
+            output_path = os.path.join(folder, f"sheet.{processor.SAVE_EXTENSIONS[save_format]}")
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                processor.save_result(sheet, output_path, save_format, args.quality, preset,
+                                      palette=flag, lossless=flag)
+                timings.append(time.perf_counter() - start)
+            size_kb = os.path.getsize(output_path) / 1024
+            print(format_row(
+                (save_format, preset, "是" if flag else "否", f"{min(timings) * 1000:.0f}", f"{size_kb:.0f}"),
+                COLUMN_WIDTHS, COLUMN_ALIGNS
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+格子结果缓存模块
+
+按源图内容和处理参数的哈希在磁盘上缓存处理后的单个格子，超出容量时按 LRU 淘汰
+"""
+
+from PIL import Image
+import hashlib
+import os
+import tempfile
+import threading
+
+
+def create_cell_cache(config_manager):
+    """
+    根据配置创建格子缓存
+    
+    @param config_manager: ConfigManager 实例
+    @return: CellCache 实例，未启用或缓存文件夹不可用时返回 None
+    """
+    if not config_manager.get("cell_cache_enabled", True):
+        return None
+    try:
+        return CellCache(
+            config_manager.get("cell_cache_dir"),
+            int(config_manager.get("cell_cache_max_mb", 512)) * 1024 * 1024
+        )
+    except (OSError, TypeError) as e:
+        print(f"初始化格子缓存失败: {e}")
+        return None
+
+
+class CellCache:
+    """内容寻址的磁盘格子缓存"""
+    
+    FILE_SUFFIX = ".png"
+    
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        """
+        初始化格子缓存
+        
+        @param cache_dir: 缓存文件夹，不存在时自动创建
+        @param max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._digests = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+    
+    def _scan(self):
+        """
+        扫描缓存文件夹
+        
+        @return: (路径, 大小, 最后访问时间) 元组列表
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(self.FILE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+    
+    def file_digest(self, file_path):
+        """
+        计算文件内容的哈希，同一会话内按 (路径, 修改时间, 大小) 复用结果
+        
+        @param file_path: 文件路径
+        @return: 十六进制哈希字符串
+        """
+        stat = os.stat(file_path)
+        stamp = (file_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            self._digests[stamp] = digest
+        return digest
+    
+    def make_key(self, source_path, *settings):
+        """
+        生成缓存键
+        
+        @param source_path: 源图路径
+        @param settings: 影响处理结果的其它参数（模板哈希、背景色、圆角、尺寸等）
+        @return: 缓存键字符串
+        """
+        hasher = hashlib.sha256(self.file_digest(source_path).encode("ascii"))
+        hasher.update(repr(settings).encode("utf-8"))
+        return hasher.hexdigest()
+    
+    def _entry_path(self, key):
+        """
+        获取缓存键对应的文件路径
+        
+        @param key: 缓存键
+        @return: 缓存文件路径
+        """
+        return os.path.join(self.cache_dir, key + self.FILE_SUFFIX)
+    
+    def contains(self, key):
+        """
+        是否存在缓存键对应的缓存文件，不读取内容
+        
+        @param key: 缓存键
+        @return: 存在时返回 True
+        """
+        return os.path.exists(self._entry_path(key))
+    
+    def get(self, key):
+        """
+        读取缓存的格子
+        
+        @param key: 缓存键
+        @return: PIL Image 对象，未命中时返回 None
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with Image.open(entry_path) as image:
+                image.load()
+            os.utime(entry_path)
+            return image
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key, image):
+        """
+        写入缓存，先写临时文件再原子替换，避免并发读到不完整的文件
+        
+        @param key: 缓存键
+        @param image: PIL Image 对象
+        """
+        entry_path = self._entry_path(key)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="PNG", compress_level=1)
+            size = os.path.getsize(temp_path)
+            with self._lock:
+                if os.path.exists(entry_path):
+                    self._total_bytes -= os.path.getsize(entry_path)
+                os.replace(temp_path, entry_path)
+                self._total_bytes += size
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"写入格子缓存失败: {e}")
+    
+    def _evict(self):
+        """按最后访问时间淘汰缓存，直到总大小降到上限的 90% 以下"""
+        target = self.max_bytes * 0.9
+        for entry_path, size, _ in sorted(self._scan(), key=lambda entry: entry[2]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(entry_path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for entry_path, _, _ in self._scan():
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
@@ -0,0 +1,259 @@
+"""
+手机壁纸边框工具 - 命令行批处理入口
+
+无界面批量处理壁纸图片，适用于构建服务器或大批量文件，不依赖 PyQt5
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from image_processor import ImageProcessor
+from config_manager import ConfigManager
+from cell_cache import create_cell_cache
+from stage_timer import StageTimer
+
+
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def resource_path(relative_path):
+    """
+    获取资源文件的绝对路径
+    
+    支持开发环境和打包后的环境
+    
+    @param relative_path: 相对于项目根目录的资源文件路径
+    @return: 资源文件的绝对路径
+    """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, relative_path)
+
+
+def parse_layout(value):
+    """
+    解析布局参数
+    
+    @param value: 布局字符串，如 "2x3"
+    @return: (行数, 列数) 元组
+    """
+    try:
+        rows, cols = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的布局: {value}，应为 行x列，如 2x3")
+    if rows < 1 or cols < 1:
+        raise argparse.ArgumentTypeError(f"无效的布局: {value}，行列数必须大于 0")
+    return rows, cols
+
+
+def collect_input_files(inputs, recursive=False):
+    """
+    收集输入图片文件
+    
+    @param inputs: 文件或文件夹路径列表
+    @param recursive: 是否递归搜索子文件夹
+    @return: 排序后的图片路径列表
+    """
+    files = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            if recursive:
+                for root, _, names in os.walk(input_path):
+                    files.extend(
+                        os.path.join(root, name) for name in sorted(names)
+                        if name.lower().endswith(VALID_EXTENSIONS)
+                    )
+            else:
+                files.extend(
+                    os.path.join(input_path, name) for name in sorted(os.listdir(input_path))
+                    if name.lower().endswith(VALID_EXTENSIONS)
+                )
+        elif os.path.isfile(input_path):
+            files.append(input_path)
+        else:
+            print(f"跳过不存在的路径: {input_path}", file=sys.stderr)
+    return files
+
+
+def build_jobs(files, rows, cols, output_dir, ext):
+    """
+    按布局把输入图片分组为输出任务
+    
+    1x1 布局每张图片输出一个同名文件，网格布局每 rows*cols 张图片拼接为一个文件
+    
+    @param files: 输入图片路径列表
+    @param rows: 行数
+    @param cols: 列数
+    @param output_dir: 输出文件夹
+    @param ext: 输出文件扩展名
+    @return: (输入图片列表, 输出路径) 元组列表
+    """
+    per_sheet = rows * cols
+    jobs = []
+    used_names = set()
+    
+    for start in range(0, len(files), per_sheet):
+        group = files[start:start + per_sheet]
+        if per_sheet == 1:
+            stem = os.path.splitext(os.path.basename(group[0]))[0]
+            name = stem
+            suffix = 1
+            while name in used_names:
+                suffix += 1
+                name = f"{stem}_{suffix}"
+        else:
+            name = f"grid_{str(len(jobs) + 1).zfill(3)}"
+        used_names.add(name)
+        jobs.append((group, os.path.join(output_dir, f"{name}.{ext}")))
+    
+    return jobs
+
+
+def run_job(processor, image_paths, output_path, rows, cols, save_format, quality, cell_workers, stream=False,
+            preset=ImageProcessor.DEFAULT_SAVE_PRESET, palette=False, lossless=False):
+    """
+    处理单个输出任务
+    
+    @param processor: ImageProcessor 实例
+    @param image_paths: 该任务的输入图片路径列表
+    @param output_path: 输出文件路径
+    @param rows: 行数
+    @param cols: 列数
+    @param save_format: 保存格式
+    @param quality: 保存质量
+    @param cell_workers: 任务内部并行处理格子的线程数
+    @param stream: 是否逐行流式拼接保存网格
+    @param preset: 保存预设名
+    @param palette: PNG 是否量化为 256 色调色板，流式保存时忽略
+    @param lossless: WebP 是否无损压缩
+    @return: 任务耗时（秒）
+    """
+    start_time = time.perf_counter()
+    if stream and rows * cols > 1:
+        processor.save_grid_streaming(
+            image_paths, rows, cols, output_path, save_format, quality, cell_workers, preset, lossless
+        )
+        return time.perf_counter() - start_time
+    
+    result = processor.render_sheet(image_paths, rows, cols, cell_workers)
+    processor.save_result(result, output_path, save_format, quality, preset, palette, lossless)
+    return time.perf_counter() - start_time
+
+
+def main(argv=None):
+    """
+    命令行主函数
+    
+    @param argv: 命令行参数列表，默认使用 sys.argv
+    @return: 进程退出码
+    """
+    config_manager = ConfigManager()
+    
+    parser = argparse.ArgumentParser(description="手机壁纸边框工具 - 命令行批处理")
+    parser.add_argument("inputs", nargs="+", help="输入图片文件或文件夹")
+    parser.add_argument("-l", "--layout", type=parse_layout, default=(1, 1), help="网格布局，如 1x1、2x3（默认 1x1）")
+    parser.add_argument("-o", "--output-dir", default=config_manager.get("output_image_folder"), help="输出文件夹")
+    parser.add_argument("-f", "--format", dest="save_format", type=str.upper, choices=list(ImageProcessor.SAVE_EXTENSIONS),
+                        default=config_manager.get("save_format", "PNG"), help="保存格式")
+    parser.add_argument("-q", "--quality", type=int, default=config_manager.get("save_quality", 95), help="保存质量 (1-100)")
+    parser.add_argument("-p", "--preset", choices=list(ImageProcessor.SAVE_PRESETS),
+                        default=config_manager.get("save_preset", ImageProcessor.DEFAULT_SAVE_PRESET),
+                        help="保存预设：fast 编码最快，balanced 均衡，smallest 文件最小")
+    parser.add_argument("--palette", action="store_true", default=config_manager.get("save_png_palette", False),
+                        help="PNG 量化为 256 色调色板（有损，文件明显更小）")
+    parser.add_argument("--lossless", action="store_true", default=config_manager.get("webp_lossless", False),
+                        help="WebP 使用无损压缩，此时 --quality 表示压缩力度")
+    parser.add_argument("-w", "--workers", type=int, default=config_manager.get("process_workers", 0),
+                        help="并行线程数，0 表示使用全部 CPU 核心")
+    parser.add_argument("-b", "--background", default=config_manager.get("canvas_background_color", "#000000"),
+                        help="画布背景颜色，如 #000000")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索输入文件夹")
+    parser.add_argument("--max-megapixels", type=float, default=config_manager.get("max_image_megapixels", 100),
+                        help="解码后允许的最大像素数（百万像素），0 表示不限制")
+    parser.add_argument("--no-cache", action="store_true", help="不使用格子缓存")
+    parser.add_argument("-s", "--stream", action="store_true",
+                        help="逐行流式拼接保存网格，适合超大布局；只有 PNG 的峰值内存与一行格子相关，"
+                             "JPG 经磁盘临时文件内存映射编码，WebP 仍占用整张画布的内存")
+    parser.add_argument("-t", "--timings", action="store_true", help="结束后打印各处理阶段的耗时统计")
+    parser.add_argument("--template", default=resource_path(os.path.join("assets", "templates", "phone-holder.png")),
+                        help="模板图片路径")
+    args = parser.parse_args(argv)
+    
+    rows, cols = args.layout
+    files = collect_input_files(args.inputs, args.recursive)
+    if not files:
+        print("没有找到可处理的 JPG 或 PNG 图片", file=sys.stderr)
+        return 1
+    
+    try:
+        cell_cache = None if args.no_cache else create_cell_cache(config_manager)
+        stage_timer = StageTimer() if args.timings else None
+        processor = ImageProcessor(
+            args.template,
+            args.background,
+            cell_cache,
+            int(args.max_megapixels * 1000000) or None,
+            stage_timer
+        )
+    except FileNotFoundError as e:
+        print(f"无法加载模板图片: {e}", file=sys.stderr)
+        return 1
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    ext = ImageProcessor.SAVE_EXTENSIONS[args.save_format]
+    jobs = build_jobs(files, rows, cols, args.output_dir, ext)
+    
+    if len(files) % (rows * cols):
+        print(f"提示: 最后一组只有 {len(files) % (rows * cols)} 张图片，空余格子将使用背景色填充", file=sys.stderr)
+    
+    workers = ImageProcessor.resolve_worker_count(args.workers)
+    job_workers = min(workers, len(jobs))
+    cell_workers = workers if len(jobs) == 1 else 1
+    
+    print(f"共 {len(files)} 张图片，{len(jobs)} 个输出文件，布局 {rows}x{cols}，{workers} 个线程")
+    
+    failed_count = 0
+    done_images = 0
+    start_time = time.perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=job_workers) as executor:
+        futures = {}
+        for image_paths, output_path in jobs:
+            future = executor.submit(
+                run_job, processor, image_paths, output_path,
+                rows, cols, args.save_format, args.quality, cell_workers, args.stream,
+                args.preset, args.palette, args.lossless
+            )
+            futures[future] = (image_paths, output_path)
+        
+        for done, future in enumerate(as_completed(futures), start=1):
+            image_paths, output_path = futures[future]
+            prefix = f"[{str(done).rjust(len(str(len(jobs))))}/{len(jobs)}]"
+            try:
+                job_time = future.result()
+                done_images += len(image_paths)
+                status = f"{prefix} 成功 {output_path} ({job_time:.2f}s)"
+            except Exception as e:
+                failed_count += 1
+                sources = ", ".join(os.path.basename(path) for path in image_paths)
+                status = f"{prefix} 失败 {output_path} <- {sources}: {e}"
+            print(status, flush=True)
+    
+    elapsed = time.perf_counter() - start_time
+    throughput = done_images / elapsed if elapsed > 0 else 0.0
+    print(f"完成: 成功 {len(jobs) - failed_count} 个，失败 {failed_count} 个，"
+          f"共处理 {done_images} 张图片，耗时 {elapsed:.2f}s，吞吐量 {throughput:.2f} 张/秒")
+    
+    if stage_timer is not None:
+        print()
+        print(stage_timer.format_stats())
+    
+    return 1 if failed_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -43,7 +43,18 @@ class ConfigManager:
             "filename_pattern": "timestamp",
             "save_format": "PNG",
             "save_quality": 95,
-            "canvas_background_color": "#000000"
+            "save_preset": "balanced",
+            "save_png_palette": False,
+            "webp_lossless": False,
+            "canvas_background_color": "#000000",
+            "process_workers": 0,
+            "max_image_megapixels": 100,
+            "cell_cache_enabled": True,
+            "cell_cache_dir": str(Path.home() / ".phone_wallpaper_cache"),
+            "cell_cache_max_mb": 512,
+            "fast_preview": True,
+            "progressive_preview": True,
+            "stage_timing_enabled": False
         }
         return default_config
     
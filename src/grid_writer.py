@@ -0,0 +1,155 @@
+"""
+网格流式写出模块
+
+按行条带逐段写出超大网格图片：PNG 逐行压缩写出，内存占用只与单行条带大小相关；
+其它格式先落盘为可内存映射的临时文件
+"""
+
+from PIL import Image, ImageChops
+import mmap
+import os
+import struct
+import tempfile
+import traceback
+import zlib
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_FILTER_UP = b"\x02"
+
+
+class PngStripWriter:
+    """
+    PNG 流式写出器
+    
+    每收到一个 RGB 条带就对其做 Up 滤波并送入同一个 zlib 压缩流，压缩后的数据立即作为 IDAT 块写入文件
+    """
+    
+    IDAT_CHUNK_SIZE = 1 << 18
+    
+    def __init__(self, file_obj, width, height, compress_level=6):
+        """
+        初始化 PNG 流式写出器
+        
+        @param file_obj: 以二进制写模式打开的文件对象
+        @param width: 图片宽度
+        @param height: 图片高度
+        @param compress_level: zlib 压缩级别 (0-9)
+        """
+        self.file_obj = file_obj
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.previous_row = None
+        self.compressor = zlib.compressobj(compress_level)
+        self.pending = bytearray()
+        
+        self.file_obj.write(PNG_SIGNATURE)
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    
+    def _write_chunk(self, chunk_type, data):
+        """
+        写入一个 PNG 数据块
+        
+        @param chunk_type: 块类型，如 b"IDAT"
+        @param data: 块数据
+        """
+        self.file_obj.write(struct.pack(">I", len(data)))
+        self.file_obj.write(chunk_type)
+        self.file_obj.write(data)
+        self.file_obj.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+    
+    def _flush_idat(self, force=False):
+        """
+        把已压缩的数据写为 IDAT 块
+        
+        @param force: 为 True 时写出全部剩余数据
+        """
+        while len(self.pending) >= self.IDAT_CHUNK_SIZE or (force and self.pending):
+            chunk = bytes(self.pending[:self.IDAT_CHUNK_SIZE])
+            del self.pending[:self.IDAT_CHUNK_SIZE]
+            self._write_chunk(b"IDAT", chunk)
+    
+    def write_strip(self, strip):
+        """
+        写入一个 RGB 条带
+        
+        @param strip: 宽度与整图一致的 RGB PIL Image 对象
+        """
+        if strip.mode != "RGB":
+            strip = strip.convert("RGB")
+        if strip.width != self.width or self.rows_written + strip.height > self.height:
+            raise ValueError("条带尺寸与图片尺寸不匹配")
+        
+        # Up 滤波：每行减去上一行，用 subtract_modulo 在 C 层完成逐字节运算
+        shifted = Image.new("RGB", strip.size)
+        if self.previous_row is not None:
+            shifted.paste(self.previous_row, (0, 0))
+        shifted.paste(strip.crop((0, 0, strip.width, strip.height - 1)), (0, 1))
+        filtered = ImageChops.subtract_modulo(strip, shifted).tobytes()
+        self.previous_row = strip.crop((0, strip.height - 1, strip.width, strip.height))
+        
+        stride = self.width * 3
+        for row in range(strip.height):
+            self.pending += self.compressor.compress(PNG_FILTER_UP + filtered[row * stride:(row + 1) * stride])
+        self.rows_written += strip.height
+        self._flush_idat()
+    
+    def close(self):
+        """结束压缩流并写入 IEND"""
+        if self.rows_written != self.height:
+            raise ValueError(f"图片行数不完整: {self.rows_written}/{self.height}")
+        self.pending += self.compressor.flush()
+        self._flush_idat(force=True)
+        self._write_chunk(b"IEND", b"")
+
+
+def spill_strips(strips, width, height, folder=None):
+    """
+    将条带依次以原始 RGBX 像素写入磁盘上的临时文件
+    
+    JPEG 等格式无法分段编码，先把像素落盘，再由 encode_spill 以内存映射方式打开。
+    RGBX 是 Pillow 能直接映射的模式（RGB 不能，打开 PPM 后 load() 会把整张图复制到堆上）
+    
+    @param strips: 依次产生 RGB 条带的可迭代对象
+    @param width: 图片宽度
+    @param height: 图片高度
+    @param folder: 临时文件所在文件夹
+    @return: 临时文件路径，调用方负责删除
+    """
+    fd, spill_path = tempfile.mkstemp(suffix=".rgbx", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            rows_written = 0
+            for strip in strips:
+                if strip.width != width or rows_written + strip.height > height:
+                    raise ValueError("条带尺寸与图片尺寸不匹配")
+                f.write(strip.convert("RGBX").tobytes())
+                rows_written += strip.height
+            if rows_written != height:
+                raise ValueError(f"图片行数不完整: {rows_written}/{height}")
+    except Exception:
+        os.remove(spill_path)
+        raise
+    return spill_path
+
+
+def encode_spill(spill_path, width, height, encode):
+    """
+    以只读内存映射方式打开 spill_strips 写出的临时文件并编码
+    
+    像素数据由系统页缓存承载，不复制到进程堆上。encode 返回后不能再持有传入的图片，
+    否则映射无法关闭
+    
+    @param spill_path: spill_strips 返回的临时文件路径
+    @param width: 图片宽度
+    @param height: 图片高度
+    @param encode: 接收 RGBX PIL Image 对象并完成编码的函数
+    """
+    with open(spill_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        try:
+            encode(Image.frombuffer("RGBX", (width, height), mapped, "raw", "RGBX", 0, 1))
+        except BaseException as e:
+            # 异常回溯中的栈帧仍引用映射出的图片，清掉这些帧的局部变量后映射才能关闭
+            traceback.clear_frames(e.__traceback__)
+            raise
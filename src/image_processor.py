@@ -4,8 +4,54 @@
 提供图片等比例缩放、居中放置和模板合成功能
 """
 
-from PIL import Image
+from PIL import Image, ImageDraw
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+import copy
+import hashlib
 import os
+import threading
+import uuid
+from grid_writer import PngStripWriter, encode_spill, spill_strips
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 像素数上限统一由 ImageProcessor.max_pixels 按实际解码尺寸检查（JPEG 降采样解码后可能远小于原图），
+# 关闭 Pillow 按原图尺寸的全局检查，否则超过约 89 MP 会告警、约 179 MP 直接拒绝，与配置的上限不一致
+Image.MAX_IMAGE_PIXELS = None
+
+# 未启用计时时各阶段共用的空上下文
+NO_TIMING = nullcontext()
+
+
+class PixelLimitError(ValueError):
+    """图片解码后的像素数超过 ImageProcessor.max_pixels"""
+
+
+@contextmanager
+def atomic_output(output_path):
+    """
+    原子写出文件：先写入同目录下的临时文件，成功后再替换为目标文件
+    
+    写出过程中崩溃或出错时目标文件保持原样，不会留下不完整的图片
+    
+    @param output_path: 目标文件路径
+    @return: 上下文中使用的临时文件路径
+    """
+    folder, name = os.path.split(os.path.abspath(output_path))
+    temp_path = os.path.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
 
 class ImageProcessor:
@@ -15,26 +61,209 @@ class ImageProcessor:
     TEMPLATE_HEIGHT = 923
     TARGET_WIDTH = 393
     TARGET_HEIGHT = 852
+    CORNER_RADIUS = 22
+    
+    # 降采样解码时保留的倍数：解码结果至少为目标尺寸的 2 倍，再用 LANCZOS 精细缩放
+    DECODE_REDUCING_GAP = 2.0
+    
+    # 壁纸缩放的重采样滤镜：正式结果使用 RESAMPLE_FILTER，draft() 生成的预览草稿使用 DRAFT_RESAMPLE_FILTER，
+    # 可在实例上单独修改
+    RESAMPLE_FILTER = Image.Resampling.LANCZOS
+    DRAFT_RESAMPLE_FILTER = Image.Resampling.BILINEAR
+    
+    # 处理算法的版本号，输出像素发生变化时递增，使旧的格子缓存失效
+    PIPELINE_VERSION = 3
+    
+    # 模板按该边长分块，根据每块的 alpha 判断直接复制、跳过还是需要混合
+    TEMPLATE_TILE_SIZE = 16
+    
+    # 保存预设：编码速度与文件大小的取舍，分别对应 PNG、JPEG 和 WebP 的编码参数
+    SAVE_PRESETS = {
+        "fast": {
+            "png": {"compress_level": 1},
+            "jpeg": {"subsampling": "4:2:0"},
+            "webp": {"method": 0},
+        },
+        "balanced": {
+            "png": {"compress_level": 6},
+            "jpeg": {"subsampling": "4:2:0", "optimize": True},
+            "webp": {"method": 4},
+        },
+        "smallest": {
+            "png": {"compress_level": 9, "optimize": True},
+            "jpeg": {"subsampling": "4:2:0", "optimize": True, "progressive": True},
+            "webp": {"method": 6},
+        },
+    }
+    DEFAULT_SAVE_PRESET = "balanced"
     
-    def __init__(self, template_path, background_color="#000000"):
+    # 支持的保存格式及其文件扩展名
+    SAVE_EXTENSIONS = {"PNG": "png", "JPG": "jpg", "WEBP": "webp"}
+    
+    # WebP 单边最大尺寸
+    WEBP_MAX_SIZE = 16383
+    
+    def __init__(self, template_path, background_color="#000000", cell_cache=None, max_pixels=None, stage_timer=None,
+                 layer_cache_size=0):
         """
         初始化图片处理器
         
         @param template_path: 模板图片路径
         @param background_color: 画布背景颜色（十六进制格式，如 "#000000"）
+        @param cell_cache: 可选的 CellCache 实例，命中时跳过整个处理流程
+        @param max_pixels: 解码后允许的最大像素数，超过时拒绝处理，None 表示不限制
+        @param stage_timer: 可选的 StageTimer 实例，设置后记录各处理阶段的耗时
+        @param layer_cache_size: 内存中缓存的壁纸图层数量，0 表示不缓存
         """
         self.template_path = template_path
         self.template_image = None
+        self.template_digest = None
+        self.template_regions = None
+        self._template_arrays = None
         self.background_color = background_color
+        self.cell_cache = cell_cache
+        self.max_pixels = max_pixels
+        self.stage_timer = stage_timer
+        self._mask_cache = {}
+        self._scratch = threading.local()
+        self.layer_cache_size = layer_cache_size
+        self._layer_cache = OrderedDict()
+        self._layer_lock = threading.Lock()
         self.load_template()
     
+    def with_background_color(self, background_color):
+        """
+        生成只有背景色不同的处理器
+        
+        与原处理器共用已加载的模板、模板区域、圆角蒙版和壁纸图层缓存，不重新读取模板和源图，
+        换背景色后只需重新合成。原处理器保持不变，正在使用它的后台任务不受影响
+        
+        @param background_color: 新的画布背景颜色
+        @return: 新的 ImageProcessor 实例
+        """
+        processor = copy.copy(self)
+        processor.background_color = background_color
+        processor._scratch = threading.local()
+        return processor
+    
+    def scaled(self, scale):
+        """
+        生成按比例缩小的预览处理器
+        
+        模板、壁纸区域、圆角和 JPEG 降采样解码的目标尺寸都按比例缩小，整个流程直接在显示分辨率上运行，
+        适合交互预览；保存时仍应使用原处理器生成全分辨率结果。预览处理器不读写磁盘格子缓存，
+        与原处理器共用背景色和像素数上限，但使用各自的图层缓存
+        
+        @param scale: 缩放比例 (0, 1]，不小于 1 时返回原处理器
+        @return: ImageProcessor 实例
+        """
+        if scale >= 1:
+            return self
+        processor = copy.copy(self)
+        processor.TEMPLATE_WIDTH = max(1, round(self.TEMPLATE_WIDTH * scale))
+        processor.TEMPLATE_HEIGHT = max(1, round(self.TEMPLATE_HEIGHT * scale))
+        processor.TARGET_WIDTH = max(1, round(self.TARGET_WIDTH * scale))
+        processor.TARGET_HEIGHT = max(1, round(self.TARGET_HEIGHT * scale))
+        processor.CORNER_RADIUS = max(1, round(self.CORNER_RADIUS * scale))
+        processor.template_image = self.template_image.resize(
+            (processor.TEMPLATE_WIDTH, processor.TEMPLATE_HEIGHT), Image.Resampling.LANCZOS
+        )
+        processor.template_regions = self.build_template_regions(processor.template_image, self.TEMPLATE_TILE_SIZE)
+        processor._template_arrays = None
+        processor.cell_cache = None
+        processor._mask_cache = {}
+        processor._scratch = threading.local()
+        processor._layer_cache = OrderedDict()
+        processor._layer_lock = threading.Lock()
+        return processor
+    
+    def draft(self):
+        """
+        生成快速草稿处理器
+        
+        解码时不再保留额外倍数，并用 DRAFT_RESAMPLE_FILTER 缩放，用于在正式结果完成前先显示预览。
+        草稿处理器不读写磁盘格子缓存和图层缓存，结果只能用于显示，不能用于保存
+        
+        @return: ImageProcessor 实例
+        """
+        processor = copy.copy(self)
+        processor.RESAMPLE_FILTER = self.DRAFT_RESAMPLE_FILTER
+        processor.DECODE_REDUCING_GAP = 1.0
+        processor.cell_cache = None
+        processor.layer_cache_size = 0
+        processor._scratch = threading.local()
+        return processor
+    
+    def timed(self, stage):
+        """
+        获取阶段计时上下文，用法: with self.timed("decode"): ...
+        
+        未设置 stage_timer 时返回共用的空上下文，几乎没有额外开销
+        
+        @param stage: 阶段名
+        @return: 上下文管理器
+        """
+        if self.stage_timer is None:
+            return NO_TIMING
+        return self.stage_timer.stage(stage)
+    
     def load_template(self):
         """加载模板图片"""
         if os.path.exists(self.template_path):
+            with open(self.template_path, "rb") as f:
+                self.template_digest = hashlib.sha256(f.read()).hexdigest()
             self.template_image = Image.open(self.template_path).convert("RGBA")
+            self.template_regions = self.build_template_regions(self.template_image, self.TEMPLATE_TILE_SIZE)
+            self._template_arrays = None
         else:
             raise FileNotFoundError(f"模板图片不存在: {self.template_path}")
     
+    @staticmethod
+    def build_template_regions(template, tile_size):
+        """
+        按 alpha 把模板划分为不透明、全透明和半透明区域
+        
+        模板按 tile_size 分块，同一行中相邻的同类块合并为一段，上下行中位置相同的段再合并为一个矩形。
+        全透明区域（屏幕开孔）合成时跳过，不透明区域（边框）直接复制，只有抗锯齿边缘所在的半透明区域需要按 alpha 混合
+        
+        @param template: RGBA 模板图片
+        @param tile_size: 分块边长（像素）
+        @return: (不透明区域, 半透明区域) 元组，每项为 (左上角坐标, 模板切片) 列表
+        """
+        alpha = template.getchannel("A")
+        width, height = template.size
+        regions = {"opaque": [], "blended": []}
+        open_runs = {}
+        
+        # 多扫描一行作为结束标记，使所有未闭合的矩形都被输出
+        for top in range(0, height + tile_size, tile_size):
+            runs = []
+            if top < height:
+                bottom = min(top + tile_size, height)
+                run = None
+                for left in range(0, width, tile_size):
+                    right = min(left + tile_size, width)
+                    low, high = alpha.crop((left, top, right, bottom)).getextrema()
+                    kind = None if high == 0 else ("opaque" if low == 255 else "blended")
+                    if run is not None and run[0] == kind:
+                        run = (kind, run[1], right)
+                    else:
+                        if run is not None and run[0] is not None:
+                            runs.append(run)
+                        run = (kind, left, right)
+                if run[0] is not None:
+                    runs.append(run)
+            
+            for run in list(open_runs):
+                if run not in runs:
+                    kind, left, right = run
+                    box = (left, open_runs.pop(run), right, min(top, height))
+                    regions[kind].append((box[:2], template.crop(box)))
+            for run in runs:
+                open_runs.setdefault(run, top)
+        
+        return regions["opaque"], regions["blended"]
+    
     def resize_image_proportional(self, image, target_width, target_height):
         """
         等比例缩放图片
@@ -46,19 +275,175 @@ class ImageProcessor:
         @param target_height: 目标高度
         @return: 缩放后的 PIL Image 对象
         """
-        original_width, original_height = image.size
+        new_width, new_height = self.compute_fill_size(image.size, target_width, target_height)
         
-        width_ratio = target_width / original_width
-        height_ratio = target_height / original_height
+        resized_image = image.resize((new_width, new_height), self.RESAMPLE_FILTER)
         
-        scale_ratio = max(width_ratio, height_ratio)
+        return resized_image
+    
+    def compute_fill_size(self, image_size, target_width, target_height):
+        """
+        计算等比例缩放后恰好覆盖目标尺寸的图片尺寸
         
-        new_width = int(original_width * scale_ratio)
-        new_height = int(original_height * scale_ratio)
+        @param image_size: 原图尺寸 (宽, 高)
+        @param target_width: 目标宽度
+        @param target_height: 目标高度
+        @return: 缩放后的尺寸 (宽, 高)
+        """
+        original_width, original_height = image_size
+        scale_ratio = max(target_width / original_width, target_height / original_height)
         
-        resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        # 浮点误差可能让 int() 少 1 像素，至少保证覆盖目标尺寸
+        new_width = max(target_width, int(original_width * scale_ratio))
+        new_height = max(target_height, int(original_height * scale_ratio))
+        return new_width, new_height
+    
+    def compute_crop_box(self, image_size, target_width, target_height):
+        """
+        计算源图中需要保留的区域
         
-        return resized_image
+        与先 resize_image_proportional 再 crop_to_size 的结果完全对应，只是把裁剪区域换算回源图坐标
+        
+        @param image_size: 源图尺寸 (宽, 高)
+        @param target_width: 目标宽度
+        @param target_height: 目标高度
+        @return: 源图坐标下的裁剪区域 (left, top, right, bottom)，可能为小数
+        """
+        original_width, original_height = image_size
+        new_width, new_height = self.compute_fill_size(image_size, target_width, target_height)
+        
+        left = (new_width - target_width) // 2
+        top = (new_height - target_height) // 2
+        
+        x_scale = original_width / new_width
+        y_scale = original_height / new_height
+        
+        return (
+            left * x_scale,
+            top * y_scale,
+            (left + target_width) * x_scale,
+            (top + target_height) * y_scale
+        )
+    
+    def resize_to_fill(self, image, target_width, target_height, reducing_gap=None):
+        """
+        先裁剪后缩放，把图片填满目标尺寸
+        
+        只对最终保留的区域做重采样，结果与 resize_image_proportional + crop_to_size 一致
+        
+        @param image: PIL Image 对象
+        @param target_width: 目标宽度
+        @param target_height: 目标高度
+        @param reducing_gap: 不为 None 时先对裁剪区域做整数倍 reduce()，再用 RESAMPLE_FILTER 缩放
+        @return: 目标尺寸的 PIL Image 对象
+        """
+        box = self.compute_crop_box(image.size, target_width, target_height)
+        return image.resize(
+            (target_width, target_height),
+            self.RESAMPLE_FILTER,
+            box=box,
+            reducing_gap=reducing_gap
+        )
+    
+    def open_wallpaper(self, wallpaper_path):
+        """
+        以足够的最小分辨率解码壁纸图片
+        
+        JPEG 通过 draft() 让解码器直接做 DCT 缩放（1/2、1/4、1/8），解码结果仍不小于目标尺寸的
+        DECODE_REDUCING_GAP 倍；其它格式完整解码，由 resize_to_fill 在裁剪区域上 reduce()。
+        解码前按文件头中的尺寸检查像素数上限
+        
+        @param wallpaper_path: 壁纸图片路径
+        @return: 已解码的 PIL Image 对象（RGB 或 RGBA）
+        """
+        image = Image.open(wallpaper_path)
+        self._apply_draft(image)
+        try:
+            self.check_pixel_count(image.size)
+        except ValueError:
+            image.close()
+            raise
+        
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        else:
+            image.load()
+        return image
+    
+    def _apply_draft(self, image):
+        """
+        为 JPEG 设置 DCT 缩放解码，只修改解码参数和 image.size，不读取像素数据
+        
+        @param image: 刚打开尚未加载的 PIL Image 对象
+        """
+        if image.format == "JPEG":
+            image.draft(image.mode, self._draft_request(image.size))
+    
+    def _draft_request(self, size):
+        """
+        计算 JPEG 降采样解码请求的最小尺寸
+        
+        @param size: 原图尺寸 (宽, 高)
+        @return: 解码结果不应小于的尺寸 (宽, 高)
+        """
+        width, height = size
+        scale_ratio = max(self.TARGET_WIDTH / width, self.TARGET_HEIGHT / height)
+        gap_ratio = min(1.0, scale_ratio * self.DECODE_REDUCING_GAP)
+        return int(width * gap_ratio), int(height * gap_ratio)
+    
+    def decode_size(self, header):
+        """
+        根据文件头信息计算 open_wallpaper 解码后的尺寸，不打开文件
+        
+        JPEG 按 Pillow draft() 的规则取不小于请求尺寸的最大 DCT 缩放倍数（1/2、1/4、1/8）
+        
+        @param header: probe_image 返回的图片信息字典
+        @return: 解码后的尺寸 (宽, 高)
+        """
+        width, height = header["size"]
+        if header["format"] != "JPEG":
+            return width, height
+        request_width, request_height = self._draft_request((width, height))
+        scale = min(width // max(1, request_width), height // max(1, request_height))
+        for factor in (8, 4, 2, 1):
+            if scale >= factor:
+                break
+        return (width + factor - 1) // factor, (height + factor - 1) // factor
+    
+    def check_pixel_count(self, size):
+        """
+        检查解码尺寸是否超过像素数上限，超过时抛出 PixelLimitError
+        
+        @param size: 解码后的尺寸 (宽, 高)
+        """
+        width, height = size
+        pixel_count = width * height
+        if self.max_pixels and pixel_count > self.max_pixels:
+            raise PixelLimitError(
+                f"图片像素过多: {width}x{height}（{pixel_count / 1e6:.1f} MP），"
+                f"超过上限 {self.max_pixels / 1e6:.1f} MP"
+            )
+    
+    def probe_image(self, wallpaper_path):
+        """
+        只读取文件头检查图片，不解码像素数据
+        
+        用于上传时快速校验，结果可供后续处理阶段复用：文件修改时间与 mtime_ns 一致时，
+        可用 decode_size 重新计算解码尺寸并按当时的像素数上限检查，无需再次打开文件。
+        无法识别的图片抛出 ValueError，像素数超过上限时抛出 PixelLimitError
+        
+        @param wallpaper_path: 壁纸图片路径
+        @return: {"format", "mode", "size", "mtime_ns"} 字典，size 为文件头中的原图尺寸
+        """
+        mtime_ns = os.stat(wallpaper_path).st_mtime_ns
+        try:
+            with Image.open(wallpaper_path) as image:
+                info = {"format": image.format, "mode": image.mode, "size": image.size, "mtime_ns": mtime_ns}
+        except Image.UnidentifiedImageError:
+            raise ValueError(f"无法识别的图片格式: {wallpaper_path}")
+        self.check_pixel_count(self.decode_size(info))
+        return info
     
     def crop_to_size(self, image, target_width, target_height):
         """
@@ -86,60 +471,383 @@ class ImageProcessor:
         @param radius: 圆角半径（像素）
         @return: 添加圆角后的 PIL Image 对象
         """
-        from PIL import ImageDraw
+        mask = self.get_rounded_mask(image.size, radius)
         
-        mask = Image.new('L', image.size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.rounded_rectangle([(0, 0), image.size], radius=radius, fill=255)
-        
-        result = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        result.paste(image, (0, 0))
+        result = image.convert('RGBA') if image.mode != 'RGBA' else image.copy()
         result.putalpha(mask)
         
         return result
     
-    def process_wallpaper(self, wallpaper_path):
+    def get_rounded_mask(self, size, radius):
+        """
+        获取圆角蒙版，按 (尺寸, 半径) 缓存
+        
+        @param size: 蒙版尺寸 (宽, 高)
+        @param radius: 圆角半径（像素）
+        @return: 'L' 模式的 PIL Image 对象，调用方不应修改
+        """
+        key = (tuple(size), radius)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            mask = Image.new('L', size, 0)
+            draw = ImageDraw.Draw(mask)
+            draw.rounded_rectangle([(0, 0), size], radius=radius, fill=255)
+            self._mask_cache[key] = mask
+        return mask
+    
+    def process_wallpaper(self, wallpaper_path, out=None):
         """
         处理壁纸图片
         
-        将用户上传的壁纸图片等比例缩放、裁剪到 393x852，然后居中放置到 471x923 画布上，最后与模板图片合成
+        将用户上传的壁纸图片等比例缩放、裁剪到 393x852，然后居中放置到 471x923 画布上，最后与模板图片合成。
+        内存中已有该图片的壁纸图层时只重新合成；否则设置了格子缓存时，命中缓存直接返回缓存结果
         
         @param wallpaper_path: 壁纸图片路径
+        @param out: 可选的 471x923 RGBA 输出图片，传入时结果直接写入其中并返回，用于复用缓冲区
         @return: 处理后的 PIL Image 对象
         """
         if not os.path.exists(wallpaper_path):
             raise FileNotFoundError(f"壁纸图片不存在: {wallpaper_path}")
         
-        wallpaper_image = Image.open(wallpaper_path).convert("RGBA")
+        # 合成一个格子比读写一次磁盘缓存快得多，此时不再经过格子缓存
+        layer = self.get_cached_layer(wallpaper_path)
+        if layer is not None:
+            return self.compose_cell(layer, out)
         
-        resized_wallpaper = self.resize_image_proportional(
-            wallpaper_image,
-            self.TARGET_WIDTH,
-            self.TARGET_HEIGHT
-        )
+        cache_key = None
+        if self.cell_cache is not None:
+            with self.timed("cache_lookup"):
+                cache_key = self.cell_cache.make_key(wallpaper_path, *self.cache_settings())
+                cached = self.cell_cache.get(cache_key)
+            if cached is not None:
+                if out is None:
+                    return cached
+                out.paste(cached, (0, 0))
+                return out
+        
+        result = self.compose_cell(self.render_layer(wallpaper_path), out)
+        
+        if cache_key is not None:
+            with self.timed("cache_store"):
+                self.cell_cache.put(cache_key, result)
+        
+        return result
+    
+    def cache_settings(self):
+        """
+        获取影响单个格子输出的全部处理参数
         
-        cropped_wallpaper = self.crop_to_size(
-            resized_wallpaper,
-            self.TARGET_WIDTH,
-            self.TARGET_HEIGHT
+        @return: 可哈希的参数元组
+        """
+        return (
+            self.PIPELINE_VERSION,
+            self.template_digest,
+            self.background_color.lower(),
+            self.CORNER_RADIUS,
+            (self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT, self.TARGET_WIDTH, self.TARGET_HEIGHT),
+            (int(self.RESAMPLE_FILTER), self.DECODE_REDUCING_GAP),
         )
+    
+    def render_layer(self, wallpaper_path):
+        """
+        生成壁纸图层：解码、裁剪并缩放到 393x852
         
-        rounded_wallpaper = self.add_rounded_corners(cropped_wallpaper, 22)
+        图层与背景色和模板无关，设置了 layer_cache_size 时按 (路径, 修改时间) 缓存在内存中
         
-        bg_color = self._hex_to_rgb(self.background_color)
-        canvas = Image.new("RGBA", (self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT), bg_color + (255,))
+        @param wallpaper_path: 壁纸图片路径
+        @return: 393x852 的 RGB 或 RGBA PIL Image 对象（尚未应用圆角），调用方不应修改
+        """
+        layer = self.get_cached_layer(wallpaper_path)
+        if layer is not None:
+            return layer
+        
+        with self.timed("decode"):
+            wallpaper_image = self.open_wallpaper(wallpaper_path)
+        
+        # 裁剪通过 resize 的 box 参数与缩放一步完成，计入 resize 阶段
+        with self.timed("resize"):
+            layer = self.resize_to_fill(
+                wallpaper_image,
+                self.TARGET_WIDTH,
+                self.TARGET_HEIGHT,
+                self.DECODE_REDUCING_GAP
+            )
+        
+        if self.layer_cache_size:
+            with self._layer_lock:
+                self._layer_cache[self._layer_key(wallpaper_path)] = layer
+                while len(self._layer_cache) > self.layer_cache_size:
+                    self._layer_cache.popitem(last=False)
+        return layer
+    
+    def _layer_key(self, wallpaper_path):
+        """
+        生成壁纸图层缓存键，源图被替换（修改时间变化）时键随之变化
+        
+        @param wallpaper_path: 壁纸图片路径
+        @return: (路径, 修改时间) 元组
+        """
+        return wallpaper_path, os.stat(wallpaper_path).st_mtime_ns
+    
+    def get_cached_layer(self, wallpaper_path):
+        """
+        获取内存中缓存的壁纸图层
+        
+        @param wallpaper_path: 壁纸图片路径
+        @return: render_layer 生成的图层，未启用缓存或未命中时返回 None
+        """
+        if not self.layer_cache_size:
+            return None
+        key = self._layer_key(wallpaper_path)
+        with self._layer_lock:
+            layer = self._layer_cache.get(key)
+            if layer is not None:
+                self._layer_cache.move_to_end(key)
+            return layer
+    
+    def has_cached_result(self, wallpaper_path):
+        """
+        格子能否直接由内存中的壁纸图层或磁盘格子缓存得到，不需要重新解码
+        
+        @param wallpaper_path: 壁纸图片路径
+        @return: 图层或格子缓存命中时返回 True
+        """
+        if not os.path.exists(wallpaper_path):
+            return False
+        if self.get_cached_layer(wallpaper_path) is not None:
+            return True
+        if self.cell_cache is None:
+            return False
+        return self.cell_cache.contains(self.cell_cache.make_key(wallpaper_path, *self.cache_settings()))
+    
+    def compose_cell(self, layer, out=None):
+        """
+        把壁纸图层和模板合成到一个输出缓冲区中
         
+        全部步骤都在输出缓冲区上原地完成：填充背景色、以缓存的圆角蒙版贴入壁纸、再按预先划分的
+        模板区域贴入模板，不再生成圆角副本、画布副本和 alpha_composite 结果等中间图片。
+        模板只有边框是不透明的，屏幕开孔处直接跳过，只有抗锯齿边缘需要以模板 alpha 混合。
+        背景不透明，因此结果 alpha 恒为 255
+        
+        @param layer: render_layer 生成的壁纸图层
+        @param out: 可选的 471x923 RGBA 输出图片，为 None 时新建
+        @return: 合成后的 PIL Image 对象
+        """
+        if self.template_image is None:
+            self.load_template()
+        
+        size = (self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT)
+        bg_color = self._hex_to_rgb(self.background_color) + (255,)
         x_offset = (self.TEMPLATE_WIDTH - self.TARGET_WIDTH) // 2
         y_offset = (self.TEMPLATE_HEIGHT - self.TARGET_HEIGHT) // 2
         
-        canvas.paste(rounded_wallpaper, (x_offset, y_offset), rounded_wallpaper)
+        with self.timed("mask"):
+            if out is None:
+                out = Image.new("RGBA", size, bg_color)
+            else:
+                out.paste(bg_color, (0, 0) + size)
+            out.paste(layer, (x_offset, y_offset), self.get_rounded_mask(layer.size, self.CORNER_RADIUS))
+        
+        with self.timed("composite"):
+            opaque_regions, blended_regions = self.template_regions
+            for position, piece in opaque_regions:
+                out.paste(piece, position)
+            for position, piece in blended_regions:
+                out.paste(piece, position, piece)
+            out.putalpha(255)
+        
+        return out
+    
+    def compose_cells(self, layers, use_numpy=None):
+        """
+        批量合成多个格子
         
+        安装了 NumPy 时，所有格子写入同一个 (N, 923, 471, 4) 数组：壁纸直接复制到开孔位置，
+        圆角和模板边缘这些需要混合的像素按预先算好的下标一次性对 N 个格子做向量化混合，
+        模板不透明的像素直接赋值。混合的取整方式与 Image.paste 一致，结果与逐个调用 compose_cell 完全相同。
+        没有 NumPy 时退回逐个调用 compose_cell
+        
+        @param layers: render_layer 生成的壁纸图层列表
+        @param use_numpy: 是否使用 NumPy，None 表示可用时使用
+        @return: 合成后的 PIL Image 对象列表
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        if not use_numpy or not layers:
+            return [self.compose_cell(layer) for layer in layers]
+        if np is None:
+            raise RuntimeError("未安装 NumPy，无法使用向量化合成")
         if self.template_image is None:
             self.load_template()
         
-        result = Image.alpha_composite(canvas, self.template_image)
+        arrays = self._get_template_arrays()
+        bg_color = self._hex_to_rgb(self.background_color)
+        x_offset = (self.TEMPLATE_WIDTH - self.TARGET_WIDTH) // 2
+        y_offset = (self.TEMPLATE_HEIGHT - self.TARGET_HEIGHT) // 2
         
-        return result
+        with self.timed("compose_batch"):
+            # 每个 RGBA 像素按 uint32 整体读写，避免逐通道的跨步拷贝
+            cells = np.empty((len(layers), self.TEMPLATE_HEIGHT, self.TEMPLATE_WIDTH, 4), dtype=np.uint8)
+            packed = cells.view(np.uint32)[..., 0]
+            packed[:] = self._pack_rgba(bg_color + (255,))
+            window = packed[:, y_offset:y_offset + self.TARGET_HEIGHT, x_offset:x_offset + self.TARGET_WIDTH]
+            for index, layer in enumerate(layers):
+                # 与 compose_cell 一致，壁纸自身的 alpha 不参与合成
+                if layer.mode != "RGB":
+                    layer = layer.convert("RGB")
+                window[index] = np.asarray(layer.convert("RGBA")).view(np.uint32)[..., 0]
+            
+            pixels = cells.reshape(len(layers), -1, 4)
+            corner_index, corner_alpha = arrays["corner"]
+            pixels[:, corner_index, :3] = self._blend_arrays(
+                np.array(bg_color, dtype=np.uint16), pixels[:, corner_index, :3], corner_alpha
+            )
+            pixels[:, corner_index, 3] = 255
+            opaque_index, opaque_rgba = arrays["opaque"]
+            packed.reshape(len(layers), -1)[:, opaque_index] = opaque_rgba
+            edge_index, edge_rgb, edge_alpha = arrays["edge"]
+            pixels[:, edge_index, :3] = self._blend_arrays(pixels[:, edge_index, :3], edge_rgb, edge_alpha)
+        
+        return [Image.fromarray(cell, "RGBA") for cell in cells]
+    
+    def _get_template_arrays(self):
+        """
+        获取向量化合成用的像素下标和模板颜色，模板重新加载后重新生成
+        
+        下标均为 471x923 画布按行展开后的一维下标：corner 为圆角蒙版中半透明或透明的像素，
+        opaque 为模板完全不透明的像素，edge 为模板半透明的像素
+        
+        @return: 包含 corner、opaque、edge 三项的字典
+        """
+        if self._template_arrays is None:
+            template = np.asarray(self.template_image).reshape(-1, 4)
+            alpha = template[:, 3]
+            opaque_index = np.flatnonzero(alpha == 255)
+            edge_index = np.flatnonzero((alpha > 0) & (alpha < 255))
+            
+            mask = np.asarray(self.get_rounded_mask((self.TARGET_WIDTH, self.TARGET_HEIGHT), self.CORNER_RADIUS))
+            rows, cols = np.nonzero(mask < 255)
+            x_offset = (self.TEMPLATE_WIDTH - self.TARGET_WIDTH) // 2
+            y_offset = (self.TEMPLATE_HEIGHT - self.TARGET_HEIGHT) // 2
+            corner_index = (rows + y_offset) * self.TEMPLATE_WIDTH + cols + x_offset
+            
+            self._template_arrays = {
+                "corner": (corner_index, mask[rows, cols].astype(np.uint16)[:, None]),
+                "opaque": (opaque_index, np.ascontiguousarray(template[opaque_index]).view(np.uint32)[:, 0]),
+                "edge": (
+                    edge_index,
+                    template[edge_index, :3].astype(np.uint16),
+                    alpha[edge_index].astype(np.uint16)[:, None],
+                ),
+            }
+        return self._template_arrays
+    
+    @staticmethod
+    def _pack_rgba(color):
+        """
+        把 RGBA 颜色打包为与 uint32 视图相同字节序的整数
+        
+        @param color: (R, G, B, A) 元组
+        @return: numpy uint32 标量
+        """
+        return np.array(color, dtype=np.uint8).view(np.uint32)[0]
+    
+    @staticmethod
+    def _blend_arrays(dst, src, alpha):
+        """
+        按 alpha 把 src 混合到 dst 上，取整方式与 Pillow 的 Image.paste 相同
+        
+        @param dst: 底层数组
+        @param src: 上层数组
+        @param alpha: 0-255 的 uint16 蒙版数组
+        @return: 混合后的 uint16 数组
+        """
+        value = dst * (255 - alpha) + src * alpha + 128
+        return ((value >> 8) + value) >> 8
+    
+    def _scratch_cell(self):
+        """
+        获取当前线程复用的格子缓冲区
+        
+        @return: 471x923 的 RGBA PIL Image 对象
+        """
+        cell = getattr(self._scratch, "cell", None)
+        if cell is None or cell.size != (self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT):
+            cell = Image.new("RGBA", (self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT))
+            self._scratch.cell = cell
+        return cell
+    
+    def process_batch(self, wallpaper_paths, max_workers=1, on_result=None, should_cancel=None,
+                      draft_processor=None, on_draft=None):
+        """
+        批量处理壁纸图片
+        
+        Pillow 的解码和缩放会释放 GIL，因此多线程可以真正利用多核并行处理各个格子。
+        传入草稿处理器时逐个格子先生成草稿再生成正式结果，每个格子的草稿显示后紧接着开始它的正式处理，
+        不必等全部草稿完成
+        
+        @param wallpaper_paths: 壁纸图片路径列表
+        @param max_workers: 并行线程数，0 或 None 表示使用全部 CPU 核心
+        @param on_result: 每张图片处理完成后的回调 on_result(index, image)，按完成顺序在调用线程中执行
+        @param should_cancel: 返回 True 时停止处理的回调函数
+        @param draft_processor: 可选，draft() 生成的草稿处理器，已有缓存结果的格子不生成草稿
+        @param on_draft: 草稿完成后的回调 on_draft(index, image)，在处理该格子的线程中执行
+        @return: 按输入顺序排列的处理结果列表，取消时返回 None
+        """
+        wallpaper_paths = list(wallpaper_paths)
+        results = [None] * len(wallpaper_paths)
+        workers = min(self.resolve_worker_count(max_workers), max(1, len(wallpaper_paths)))
+        
+        def process(idx, wallpaper_path):
+            if draft_processor is not None and not self.has_cached_result(wallpaper_path):
+                on_draft(idx, draft_processor.process_wallpaper(wallpaper_path))
+                if should_cancel and should_cancel():
+                    return None
+            return self.process_wallpaper(wallpaper_path)
+        
+        if workers == 1:
+            for idx, wallpaper_path in enumerate(wallpaper_paths):
+                if should_cancel and should_cancel():
+                    return None
+                results[idx] = process(idx, wallpaper_path)
+                if should_cancel and should_cancel():
+                    return None
+                if on_result:
+                    on_result(idx, results[idx])
+            return results
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(process, idx, wallpaper_path): idx
+                for idx, wallpaper_path in enumerate(wallpaper_paths)
+            }
+            try:
+                for future in as_completed(futures):
+                    if should_cancel and should_cancel():
+                        return None
+                    idx = futures[future]
+                    results[idx] = future.result()
+                    if on_result:
+                        on_result(idx, results[idx])
+            finally:
+                for future in futures:
+                    future.cancel()
+        
+        if should_cancel and should_cancel():
+            return None
+        return results
+    
+    @staticmethod
+    def resolve_worker_count(max_workers):
+        """
+        解析并行线程数
+        
+        @param max_workers: 配置的线程数，0 或 None 表示自动
+        @return: 实际使用的线程数（至少为 1）
+        """
+        if not max_workers or max_workers < 0:
+            return os.cpu_count() or 1
+        return max_workers
     
     def _hex_to_rgb(self, hex_color):
         """
@@ -163,35 +871,202 @@ class ImageProcessor:
         canvas_width = cols * self.TEMPLATE_WIDTH
         canvas_height = rows * self.TEMPLATE_HEIGHT
         bg_color = self._hex_to_rgb(self.background_color)
-        canvas = Image.new('RGB', (canvas_width, canvas_height), bg_color)
         
-        for idx, img in enumerate(processed_images):
-            row = idx // cols
-            col = idx % cols
-            x = col * self.TEMPLATE_WIDTH
-            y = row * self.TEMPLATE_HEIGHT
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            canvas.paste(img, (x, y))
+        with self.timed("grid"):
+            canvas = Image.new('RGB', (canvas_width, canvas_height), bg_color)
+            
+            for idx, img in enumerate(processed_images):
+                self._paste_grid_cell(canvas, idx, img, cols)
         
         return canvas
     
-    def save_result(self, image, output_path, save_format="PNG", quality=95):
+    def render_sheet(self, wallpaper_paths, rows, cols, max_workers=1):
         """
-        保存处理后的图片
+        处理全部图片并拼接为最终结果
         
-        @param image: PIL Image 对象
+        @param wallpaper_paths: 壁纸图片路径列表
+        @param rows: 行数
+        @param cols: 列数
+        @param max_workers: 并行处理的线程数，0 表示使用全部 CPU 核心
+        @return: 1x1 布局返回单个格子，否则返回拼接后的网格
+        """
+        processed_images = self.process_batch(wallpaper_paths, max_workers=max_workers)
+        if rows == 1 and cols == 1:
+            return processed_images[0]
+        return self.create_grid_layout(processed_images, rows, cols)
+    
+    def update_grid_layout(self, canvas, changed_cells, cols):
+        """
+        在已有网格的副本上只重新贴入变化的格子
+        
+        @param canvas: create_grid_layout 返回的网格图片，不会被修改
+        @param changed_cells: {格子序号: 处理后的图片} 字典
+        @param cols: 列数
+        @return: 更新后的 PIL Image 对象
+        """
+        if canvas.width != cols * self.TEMPLATE_WIDTH or canvas.height % self.TEMPLATE_HEIGHT:
+            raise ValueError(f"网格尺寸 {canvas.width}x{canvas.height} 与当前格子尺寸不一致，无法增量更新")
+        with self.timed("grid"):
+            canvas = canvas.copy()
+            for idx, img in changed_cells.items():
+                self._paste_grid_cell(canvas, idx, img, cols)
+        return canvas
+    
+    def _paste_grid_cell(self, canvas, idx, img, cols):
+        """
+        把单个格子贴到网格画布的对应位置
+        
+        @param canvas: RGB 网格画布
+        @param idx: 格子序号
+        @param img: 处理后的图片
+        @param cols: 列数
+        """
+        x = (idx % cols) * self.TEMPLATE_WIDTH
+        y = (idx // cols) * self.TEMPLATE_HEIGHT
+        if img.mode == 'RGBA':
+            img = img.convert('RGB')
+        canvas.paste(img, (x, y))
+    
+    def iter_grid_strips(self, wallpaper_paths, rows, cols, max_workers=1):
+        """
+        逐行生成网格条带
+        
+        每次只处理一行的格子，各线程把格子渲染到自己复用的缓冲区后直接贴入条带，
+        条带本身也在各行之间复用
+        
+        @param wallpaper_paths: 壁纸图片路径列表，不足 rows*cols 时空余格子填充背景色
+        @param rows: 行数
+        @param cols: 列数
+        @param max_workers: 每行内部并行处理的线程数
+        @return: 依次产生 (cols*471) x 923 RGB 条带的生成器，产生的条带在下一次迭代时会被覆盖
+        """
+        bg_color = self._hex_to_rgb(self.background_color)
+        strip = Image.new('RGB', (cols * self.TEMPLATE_WIDTH, self.TEMPLATE_HEIGHT), bg_color)
+        workers = min(self.resolve_worker_count(max_workers), cols)
+        
+        def render_cell(col, wallpaper_path):
+            cell = self.process_wallpaper(wallpaper_path, out=self._scratch_cell())
+            with self.timed("grid"):
+                strip.paste(cell, (col * self.TEMPLATE_WIDTH, 0))
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for row in range(rows):
+                if row > 0:
+                    strip.paste(bg_color, (0, 0) + strip.size)
+                row_paths = wallpaper_paths[row * cols:(row + 1) * cols]
+                if workers == 1:
+                    for col, wallpaper_path in enumerate(row_paths):
+                        render_cell(col, wallpaper_path)
+                else:
+                    futures = [
+                        executor.submit(render_cell, col, wallpaper_path)
+                        for col, wallpaper_path in enumerate(row_paths)
+                    ]
+                    for future in futures:
+                        future.result()
+                yield strip
+    
+    def save_grid_streaming(self, wallpaper_paths, rows, cols, output_path, save_format="PNG", quality=95, max_workers=1,
+                            preset=DEFAULT_SAVE_PRESET, lossless=False):
+        """
+        流式处理并保存网格拼接图
+        
+        与 create_grid_layout + save_result 结果一致，但不会同时持有整张画布和全部格子：
+        PNG 逐行压缩写出，峰值内存只与一行格子相关；JPG 和 WebP 先把条带写入磁盘临时文件，
+        再以内存映射方式交给编码器，像素由系统页缓存承载而不是进程堆。JPEG 的 fast 预设逐行编码，
+        开启 optimize/progressive 的预设中 libjpeg 仍会缓存整图的 DCT 系数（约为 RGB 画布的一半）；
+        WebP 编码器会把整张图复制到自己的缓冲区，峰值内存仍与整张画布相当。
+        逐行写出时无法统计整图颜色，因此不支持调色板量化
+        
+        @param wallpaper_paths: 壁纸图片路径列表
+        @param rows: 行数
+        @param cols: 列数
         @param output_path: 输出文件路径
-        @param save_format: 保存格式 (PNG 或 JPG)
+        @param save_format: 保存格式 (PNG、JPG 或 WEBP)
         @param quality: 保存质量 (1-100)
+        @param max_workers: 每行内部并行处理的线程数
+        @param preset: 保存预设名，见 SAVE_PRESETS
+        @param lossless: WebP 是否无损压缩
         """
-        if image.mode == "RGBA" and save_format == "JPG":
-            image = image.convert("RGB")
+        width = cols * self.TEMPLATE_WIDTH
+        height = rows * self.TEMPLATE_HEIGHT
+        self.check_save_size((width, height), save_format)
+        strips = self.iter_grid_strips(wallpaper_paths, rows, cols, max_workers)
         
         if save_format == "PNG":
-            image.save(output_path, format="PNG", optimize=True)
-        else:
-            if image.mode == "RGBA":
-                image = image.convert("RGB")
-            image.save(output_path, format="JPEG", quality=quality)
+            # 逐条带计时编码，条带本身的处理时间已分别计入各处理阶段
+            with atomic_output(output_path) as temp_path, open(temp_path, "wb") as f:
+                writer = PngStripWriter(f, width, height, self.get_save_preset(preset)["png"]["compress_level"])
+                for strip in strips:
+                    with self.timed("encode"):
+                        writer.write_strip(strip)
+                with self.timed("encode"):
+                    writer.close()
+            return
+        
+        spill_path = spill_strips(strips, width, height, os.path.dirname(os.path.abspath(output_path)))
+        try:
+            encode_spill(
+                spill_path, width, height,
+                lambda sheet: self.save_result(sheet, output_path, save_format, quality, preset, lossless=lossless)
+            )
+        finally:
+            os.remove(spill_path)
+    
+    def get_save_preset(self, preset):
+        """
+        获取保存预设的编码参数
+        
+        @param preset: 预设名 (fast、balanced 或 smallest)
+        @return: {"png": PNG 参数, "jpeg": JPEG 参数, "webp": WebP 参数} 字典
+        """
+        if preset not in self.SAVE_PRESETS:
+            raise ValueError(f"未知的保存预设: {preset}，可选: {', '.join(self.SAVE_PRESETS)}")
+        return self.SAVE_PRESETS[preset]
+    
+    def check_save_size(self, size, save_format):
+        """
+        检查图片尺寸是否超出保存格式的限制
+        
+        @param size: 图片尺寸 (宽, 高)
+        @param save_format: 保存格式
+        """
+        if save_format == "WEBP" and max(size) > self.WEBP_MAX_SIZE:
+            raise ValueError(
+                f"WebP 图片单边不能超过 {self.WEBP_MAX_SIZE} 像素，当前为 {size[0]}x{size[1]}，请减少行列数或改用 PNG/JPG"
+            )
+    
+    def save_result(self, image, output_path, save_format="PNG", quality=95, preset=DEFAULT_SAVE_PRESET, palette=False,
+                    lossless=False):
+        """
+        保存处理后的图片
+        
+        @param image: PIL Image 对象
+        @param output_path: 输出文件路径
+        @param save_format: 保存格式 (PNG、JPG 或 WEBP)
+        @param quality: 保存质量 (1-100)；WebP 无损时表示压缩力度
+        @param preset: 保存预设名，见 SAVE_PRESETS
+        @param palette: PNG 是否量化为 256 色调色板（有损，文件明显更小）
+        @param lossless: WebP 是否无损压缩
+        """
+        options = self.get_save_preset(preset)
+        if save_format not in self.SAVE_EXTENSIONS:
+            raise ValueError(f"不支持的保存格式: {save_format}")
+        self.check_save_size(image.size, save_format)
+        
+        # 写入临时文件后原子替换，中途失败不会留下截断的输出文件
+        with self.timed("encode"), atomic_output(output_path) as temp_path:
+            if save_format == "PNG":
+                if palette:
+                    image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+                image.save(temp_path, format="PNG", **options["png"])
+            elif save_format == "WEBP":
+                # 合成结果不透明，去掉 alpha 通道避免额外编码 alpha 平面
+                if image.mode == "RGBA":
+                    image = image.convert("RGB")
+                image.save(temp_path, format="WEBP", quality=quality, lossless=lossless, **options["webp"])
+            else:
+                if image.mode == "RGBA":
+                    image = image.convert("RGB")
+                image.save(temp_path, format="JPEG", quality=quality, **options["jpeg"])
 
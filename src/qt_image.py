@@ -0,0 +1,45 @@
+"""
+PIL 与 Qt 图片转换模块
+
+在内存中直接把 PIL 像素缓冲区包装为 QImage，预览路径不再经过临时文件和 PNG 编解码
+"""
+
+from PyQt5.QtGui import QImage, QPixmap
+
+
+_QT_FORMATS = {
+    "RGBA": (QImage.Format_RGBA8888, 4),
+    "RGB": (QImage.Format_RGB888, 3),
+    "L": (QImage.Format_Grayscale8, 1),
+}
+
+
+def pil_to_qimage(image):
+    """
+    将 PIL Image 转换为 QImage
+    
+    返回的 QImage 直接引用 PIL 导出的像素缓冲区而不复制，跨线程传递或长期保存前
+    应调用 QImage.copy() 或转换为 QPixmap
+    
+    @param image: PIL Image 对象
+    @return: QImage 对象
+    """
+    if image.mode not in _QT_FORMATS:
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    
+    qt_format, bytes_per_pixel = _QT_FORMATS[image.mode]
+    buffer = image.tobytes()
+    qimage = QImage(buffer, image.width, image.height, image.width * bytes_per_pixel, qt_format)
+    qimage._pil_buffer = buffer
+    return qimage
+
+
+def pil_to_pixmap(image):
+    """
+    将 PIL Image 转换为 QPixmap
+    
+    @param image: PIL Image 对象
+    @return: QPixmap 对象
+    """
+    return QPixmap.fromImage(pil_to_qimage(image))
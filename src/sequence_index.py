@@ -0,0 +1,122 @@
+"""
+顺序文件名索引模块
+
+静默保存使用顺序命名时，在输出文件夹中持久化每种格式的最大编号，分配新文件名不再扫描整个文件夹
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+
+class SequenceIndex:
+    """按文件夹和格式分配 wallpaper_NNN 形式的顺序文件名"""
+    
+    INDEX_FILE = ".wallpaper_sequence.json"
+    PREFIX = "wallpaper_"
+    DIGITS = 3
+    
+    # 同一进程内的多个窗口或线程共用一把锁，跨进程的冲突由独占创建保证
+    _lock = threading.Lock()
+    
+    def __init__(self, folder):
+        """
+        初始化顺序文件名索引
+        
+        @param folder: 输出文件夹
+        """
+        self.folder = folder
+        self.index_path = os.path.join(folder, self.INDEX_FILE)
+    
+    def _read(self):
+        """
+        读取索引文件
+        
+        @return: {扩展名: 最大编号} 字典，索引不存在或已损坏时返回 None
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                counters = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(counters, dict):
+            return None
+        return {ext: num for ext, num in counters.items() if isinstance(num, int)}
+    
+    def _write(self, counters):
+        """
+        写入索引文件，先写临时文件再原子替换
+        
+        索引只用于加速，写入失败（如文件夹只读）时忽略，下次分配会重建
+        
+        @param counters: {扩展名: 最大编号} 字典
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(counters, f)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def rebuild(self):
+        """
+        扫描输出文件夹重建索引
+        
+        @return: {扩展名: 最大编号} 字典
+        """
+        counters = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                stem, dot, ext = entry.name.rpartition(".")
+                if not dot or not stem.startswith(self.PREFIX):
+                    continue
+                num_part = stem[len(self.PREFIX):]
+                if num_part.isdigit():
+                    counters[ext] = max(counters.get(ext, 0), int(num_part))
+        return counters
+    
+    def allocate(self, ext):
+        """
+        分配下一个顺序文件名并以独占方式创建空的占位文件
+        
+        占位文件保证其它线程或进程不会分配到同一个文件名，保存时由原子替换覆盖
+        
+        @param ext: 文件扩展名，如 "png"
+        @return: 新文件的完整路径
+        """
+        with self._lock:
+            counters = self._read()
+            if counters is None or ext not in counters:
+                counters = {**self.rebuild(), **(counters or {})}
+            num = counters.get(ext, 0)
+            while True:
+                num += 1
+                path = os.path.join(self.folder, f"{self.PREFIX}{str(num).zfill(self.DIGITS)}.{ext}")
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    # 索引落后于文件夹（如其它进程刚保存或文件被复制进来），继续向后找
+                    continue
+            counters[ext] = num
+            self._write(counters)
+        return path
+    
+    @staticmethod
+    def release(path):
+        """
+        保存失败时删除仍为空的占位文件
+        
+        @param path: allocate 返回的文件路径
+        """
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,130 @@
+"""
+分阶段计时模块
+
+记录解码、缩放、合成、编码等各处理阶段的耗时并汇总统计，用于定位批处理的瓶颈
+"""
+
+from contextlib import contextmanager
+import threading
+import time
+import unicodedata
+
+
+def display_width(text):
+    """
+    计算文本在等宽字体终端中占用的列数，中文等全角字符占两列
+    
+    @param text: 文本
+    @return: 列数
+    """
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+def format_row(cells, widths, aligns):
+    """
+    按显示宽度对齐一行表格
+    
+    @param cells: 各列文本
+    @param widths: 各列宽度（列数）
+    @param aligns: 各列对齐方式字符串，"<" 左对齐，">" 右对齐
+    @return: 以空格分隔的一行文本
+    """
+    padded = []
+    for cell, width, align in zip(cells, widths, aligns):
+        padding = " " * max(0, width - display_width(cell))
+        padded.append(cell + padding if align == "<" else padding + cell)
+    return " ".join(padded)
+
+
+class StageTimer:
+    """线程安全的分阶段计时器"""
+    
+    def __init__(self, on_record=None):
+        """
+        初始化计时器
+        
+        @param on_record: 可选回调，每记录一次调用 on_record(阶段名, 耗时秒数)，在执行该阶段的线程中调用
+        """
+        self.on_record = on_record
+        self._samples = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name):
+        """
+        计时一个阶段，用法: with timer.stage("decode"): ...
+        
+        阶段抛出异常时不记录
+        
+        @param name: 阶段名
+        """
+        start = time.perf_counter()
+        yield
+        self.record(name, time.perf_counter() - start)
+    
+    def record(self, name, seconds):
+        """
+        记录一次阶段耗时
+        
+        @param name: 阶段名
+        @param seconds: 耗时（秒）
+        """
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+        if self.on_record is not None:
+            self.on_record(name, seconds)
+    
+    def stats(self):
+        """
+        汇总各阶段的统计数据
+        
+        @return: {阶段名: {"count", "total", "p50", "p95"}} 字典，按记录先后排序，时间单位为秒
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+        return {
+            name: {
+                "count": len(values),
+                "total": sum(values),
+                "p50": self._percentile(values, 50),
+                "p95": self._percentile(values, 95),
+            }
+            for name, values in samples.items()
+        }
+    
+    @staticmethod
+    def _percentile(sorted_values, percent):
+        """
+        按最近秩法计算百分位数
+        
+        @param sorted_values: 已排序的非空数值列表
+        @param percent: 百分位 (0-100)
+        @return: 百分位数
+        """
+        rank = max(1, -(-len(sorted_values) * percent // 100))
+        return sorted_values[rank - 1]
+    
+    def format_stats(self):
+        """
+        把统计数据格式化为文本表格
+        
+        @return: 多行字符串，没有记录时返回空字符串
+        """
+        stats = self.stats()
+        if not stats:
+            return ""
+        width = max(4, max(display_width(name) for name in stats))
+        widths = (width, 6, 10, 10, 10)
+        lines = [format_row(("阶段", "次数", "总计(秒)", "p50(毫秒)", "p95(毫秒)"), widths, "<>>>>")]
+        for name, item in stats.items():
+            lines.append(format_row(
+                (name, str(item["count"]), f"{item['total']:.3f}",
+                 f"{item['p50'] * 1000:.2f}", f"{item['p95'] * 1000:.2f}"),
+                widths, "<>>>>"
+            ))
+        return "\n".join(lines)
+    
+    def reset(self):
+        """清空全部记录"""
+        with self._lock:
+            self._samples.clear()
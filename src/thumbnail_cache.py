@@ -0,0 +1,102 @@
+"""
+缩略图缓存模块
+
+按 (路径, 修改时间, 目标尺寸) 缓存缩略图，避免重复解码原图
+"""
+
+from collections import OrderedDict
+from PIL import Image
+import os
+import threading
+
+
+class ThumbnailCache:
+    """有容量上限的 LRU 缩略图缓存"""
+    
+    def __init__(self, max_entries=128):
+        """
+        初始化缩略图缓存
+        
+        @param max_entries: 最多缓存的缩略图数量
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, image_path, size):
+        """
+        获取适合指定尺寸的缩略图
+        
+        命中缓存时直接返回；否则优先从同一图片已缓存的更大缩略图缩小得到，
+        只有没有可用缓存时才重新解码原图
+        
+        @param image_path: 原图路径
+        @param size: 缩略图最大尺寸 (宽, 高)
+        @return: PIL Image 对象，调用方不应修改
+        """
+        size = (max(1, size[0]), max(1, size[1]))
+        mtime = os.stat(image_path).st_mtime_ns
+        key = (image_path, mtime, size)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            source = self._find_larger(image_path, mtime, size)
+        
+        if source is not None:
+            thumbnail, original_size = source
+            thumbnail = thumbnail.copy()
+        else:
+            thumbnail = Image.open(image_path)
+            original_size = thumbnail.size
+        thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
+        
+        with self._lock:
+            self._entries[key] = (thumbnail, original_size)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        
+        return thumbnail
+    
+    def _find_larger(self, image_path, mtime, size):
+        """
+        查找同一图片中能缩小到目标尺寸的最小已缓存缩略图
+        
+        @param image_path: 原图路径
+        @param mtime: 原图修改时间
+        @param size: 目标尺寸 (宽, 高)
+        @return: (缩略图, 原图尺寸) 元组，没有时返回 None
+        """
+        best = None
+        for (path, entry_mtime, _), (thumbnail, original_size) in self._entries.items():
+            if path != image_path or entry_mtime != mtime:
+                continue
+            needed = self._fit_size(original_size, size)
+            if thumbnail.width < needed[0] or thumbnail.height < needed[1]:
+                continue
+            if best is None or thumbnail.width * thumbnail.height < best[0].width * best[0].height:
+                best = (thumbnail, original_size)
+        return best
+    
+    @staticmethod
+    def _fit_size(original_size, size):
+        """
+        计算原图缩放到目标尺寸内后的实际尺寸
+        
+        与 Image.thumbnail 一致：保持宽高比且不放大
+        
+        @param original_size: 原图尺寸 (宽, 高)
+        @param size: 目标尺寸 (宽, 高)
+        @return: 缩略图尺寸 (宽, 高)
+        """
+        width, height = original_size
+        scale = min(size[0] / width, size[1] / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
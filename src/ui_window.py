@@ -11,13 +11,20 @@ from PyQt5.QtWidgets import (
     QListWidgetItem, QScrollArea, QSpinBox, QStackedWidget,
     QCheckBox, QComboBox, QSlider, QLineEdit, QGroupBox, QColorDialog
 )
-from PyQt5.QtCore import Qt, QSize, QPoint, QRect, pyqtSignal
+from PyQt5.QtCore import Qt, QSize, QPoint, QRect, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QFont, QDragEnterEvent, QDropEvent, QIcon, QColor, QPainter, QBrush, QPen
+from collections import OrderedDict
+import math
 import sys
 import os
-from PIL import Image
 from image_processor import ImageProcessor
 from config_manager import ConfigManager
+from workers import ProcessWorker, ThumbnailWorker, ProbeWorker, SaveWorker
+from sequence_index import SequenceIndex
+from qt_image import pil_to_qimage, pil_to_pixmap
+from thumbnail_cache import ThumbnailCache
+from cell_cache import create_cell_cache
+from stage_timer import StageTimer
 
 
 def resource_path(relative_path):
@@ -41,6 +48,8 @@ class ImageGridPreview(QWidget):
     
     image_removed = pyqtSignal(int)
     
+    RESIZE_DEBOUNCE_MS = 150
+    
     def __init__(self, parent=None):
         """初始化图片网格预览控件"""
         super().__init__(parent)
@@ -48,10 +57,18 @@ class ImageGridPreview(QWidget):
         self.layout_grid = (1, 1)
         self.hover_index = -1
         self.cell_rects = []
-        self.pixmaps = []
+        self.pixmaps = {}
+        self.thumbnail_cache = ThumbnailCache()
+        self.thumbnail_worker = None
+        self.load_generation = 0
         self.setMouseTracking(True)
         self.setMinimumSize(350, 300)
         
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(self.RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.load_images)
+        
         self.setStyleSheet("""
             QWidget {
                 background-color: #2b2d30;
@@ -62,54 +79,107 @@ class ImageGridPreview(QWidget):
     
     def set_images(self, image_paths, layout=(1, 1)):
         """设置图片列表和布局"""
-        self.images = image_paths
+        self.images = list(image_paths)
         self.layout_grid = layout
         self.hover_index = -1
+        self.pixmaps = {path: self.pixmaps[path] for path in self.images if path in self.pixmaps}
+        self.update_cell_rects()
         self.load_images()
         self.update()
     
-    def load_images(self):
-        """加载图片为 QPixmap"""
-        self.pixmaps = []
+    def thumbnail_size(self):
+        """
+        计算当前单元格内缩略图的最大尺寸
+        
+        @return: (宽, 高) 元组
+        """
+        rows, cols = self.layout_grid
+        cell_width = (self.width() - 20) // cols
+        cell_height = (self.height() - 20) // rows
+        return cell_width - 10, cell_height - 10
+    
+    def update_cell_rects(self):
+        """根据当前控件尺寸重新计算单元格区域"""
+        rows, cols = self.layout_grid
+        cell_width = (self.width() - 20) // cols
+        cell_height = (self.height() - 20) // rows
+        
         self.cell_rects = []
+        for idx in range(min(len(self.images), rows * cols)):
+            x = 10 + (idx % cols) * cell_width
+            y = 10 + (idx // cols) * cell_height
+            self.cell_rects.append(QRect(x, y, cell_width, cell_height))
+    
+    def load_images(self):
+        """在后台线程按当前尺寸重新生成缩略图，旧尺寸的结果会被丢弃"""
+        self.load_generation += 1
+        if self.thumbnail_worker is not None:
+            self.thumbnail_worker.cancel()
+            self.thumbnail_worker = None
         
-        if not self.images:
+        rows, cols = self.layout_grid
+        image_paths = self.images[:rows * cols]
+        if not image_paths:
             return
         
-        rows, cols = self.layout_grid
-        widget_width = self.width() - 20
-        widget_height = self.height() - 20
+        worker = ThumbnailWorker(
+            self.thumbnail_cache,
+            image_paths,
+            self.thumbnail_size(),
+            self.load_generation,
+            self
+        )
+        worker.thumbnail_ready.connect(self.on_thumbnail_ready)
+        worker.thumbnail_failed.connect(self.on_thumbnail_failed)
+        worker.finished.connect(worker.deleteLater)
+        self.thumbnail_worker = worker
+        worker.start()
+    
+    def on_thumbnail_ready(self, generation, image_path, image, size):
+        """
+        缩略图生成完成
         
-        cell_width = widget_width // cols
-        cell_height = widget_height // rows
+        @param generation: 生成批次，与当前批次不一致时丢弃
+        @param image_path: 原图路径
+        @param image: 缩略图 PIL Image 对象
+        @param size: 生成时的缩略图最大尺寸
+        """
+        if generation != self.load_generation:
+            return
+        self.pixmaps[image_path] = (pil_to_pixmap(image), size)
+        self.update()
+    
+    def on_thumbnail_failed(self, generation, image_path, message):
+        """
+        缩略图生成失败
         
-        for idx, img_path in enumerate(self.images):
-            if idx >= rows * cols:
-                break
-            
-            try:
-                pil_img = Image.open(img_path)
-                pil_img.thumbnail((cell_width - 10, cell_height - 10), Image.Resampling.LANCZOS)
-                
-                temp_path = f"temp_preview_{idx}.png"
-                pil_img.save(temp_path)
-                pixmap = QPixmap(temp_path)
-                
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                
-                self.pixmaps.append(pixmap)
-                
-                row = idx // cols
-                col = idx % cols
-                x = 10 + col * cell_width
-                y = 10 + row * cell_height
-                
-                self.cell_rects.append(QRect(x, y, cell_width, cell_height))
-                
-            except Exception as e:
-                self.pixmaps.append(None)
-                print(f"加载图片失败: {img_path}, 错误: {e}")
+        @param generation: 生成批次
+        @param image_path: 原图路径
+        @param message: 错误信息
+        """
+        if generation != self.load_generation:
+            return
+        self.pixmaps.pop(image_path, None)
+        print(f"加载图片失败: {image_path}, 错误: {message}")
+    
+    def pixmap_target_rect(self, pixmap, generated_size, cell_rect):
+        """
+        计算缩略图在单元格中的绘制区域
+        
+        缩略图尺寸与当前单元格不一致时按比例缩放显示，等待后台生成清晰的新缩略图
+        
+        @param pixmap: 缩略图 QPixmap
+        @param generated_size: 生成该缩略图时的最大尺寸
+        @param cell_rect: 单元格区域
+        @return: 绘制区域 QRect
+        """
+        target_width, target_height = self.thumbnail_size()
+        scale = min(target_width / generated_size[0], target_height / generated_size[1])
+        width = max(1, round(pixmap.width() * scale))
+        height = max(1, round(pixmap.height() * scale))
+        x = cell_rect.x() + (cell_rect.width() - width) // 2
+        y = cell_rect.y() + (cell_rect.height() - height) // 2
+        return QRect(x, y, width, height)
     
     def paintEvent(self, event):
         """绘制图片网格"""
@@ -123,11 +193,10 @@ class ImageGridPreview(QWidget):
             painter.drawText(self.rect(), Qt.AlignCenter, "原始图片")
             return
         
-        for idx, (pixmap, cell_rect) in enumerate(zip(self.pixmaps, self.cell_rects)):
+        for idx, (img_path, cell_rect) in enumerate(zip(self.images, self.cell_rects)):
+            pixmap, generated_size = self.pixmaps.get(img_path, (None, None))
             if pixmap and not pixmap.isNull():
-                img_x = cell_rect.x() + (cell_rect.width() - pixmap.width()) // 2
-                img_y = cell_rect.y() + (cell_rect.height() - pixmap.height()) // 2
-                painter.drawPixmap(img_x, img_y, pixmap)
+                painter.drawPixmap(self.pixmap_target_rect(pixmap, generated_size, cell_rect), pixmap)
                 
                 if idx == self.hover_index:
                     painter.setBrush(QBrush(QColor(0, 0, 0, 150)))
@@ -177,15 +246,25 @@ class ImageGridPreview(QWidget):
         self.update()
     
     def resizeEvent(self, event):
-        """窗口大小改变事件"""
+        """窗口大小改变事件，立即按比例重绘，尺寸稳定后再在后台重新生成缩略图"""
         super().resizeEvent(event)
+        self.update_cell_rects()
         if self.images:
-            self.load_images()
+            self.resize_timer.start()
 
 
 class MainWindow(QMainWindow):
     """主窗口类"""
     
+    # 格子结果缓存在当前布局格子数之外额外保留的格子数
+    CELL_RESULT_EXTRA = 16
+    # 处理器在内存中缓存的壁纸图层数量（每个约 1 MB），换背景色时无需重新解码
+    LAYER_CACHE_SIZE = 64
+    # 快速预览的缩放比例按此步长向上取整，预览区尺寸略有变化时仍复用同一个预览处理器
+    PREVIEW_SCALE_STEP = 0.05
+    # 上传校验失败时对话框中最多列出的图片数
+    PROBE_FAILURE_DETAILS = 10
+    
     def __init__(self, template_path):
         """
         初始化主窗口
@@ -195,13 +274,38 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.template_path = template_path
         self.processor = None
+        self.preview_processor = None
+        self.preview_processor_source = None
+        self.full_render_source = None
+        # 恢复默认设置期间逐个更新控件，此时不能把尚未恢复的控件值写回配置
+        self._resetting_settings = False
         self.current_wallpaper_path = None
         self.processed_image = None
+        self.process_worker = None
+        self.result_preview_pixmap = None
+        self.cell_results = OrderedDict()
+        self.processing_keys = []
+        self.last_grid = None
         self.uploaded_images = []
+        self.image_info = {}
+        self.probing_paths = set()
+        self.probe_generation = 0
+        self.probe_added_count = 0
+        self.probe_failures = []
         self.current_layout = (1, 1)
         self.drag_position = QPoint()
         self.is_maximized = False
         self.config_manager = ConfigManager()
+        self.cell_cache = create_cell_cache(self.config_manager)
+        self.stage_timer = StageTimer() if self.config_manager.get("stage_timing_enabled", False) else None
+        self.save_worker = SaveWorker(self)
+        self.save_worker.saved.connect(self.on_image_saved)
+        self.save_worker.save_failed.connect(self.on_image_save_failed)
+        # 校验中逐张添加图片时合并刷新预览网格，避免每张都重启缩略图线程
+        self.preview_refresh_timer = QTimer(self)
+        self.preview_refresh_timer.setSingleShot(True)
+        self.preview_refresh_timer.setInterval(100)
+        self.preview_refresh_timer.timeout.connect(self.update_preview_grid)
         self.init_ui()
         self.init_processor()
     
@@ -209,7 +313,15 @@ class MainWindow(QMainWindow):
         """初始化图片处理器"""
         try:
             background_color = self.config_manager.get("canvas_background_color", "#000000")
-            self.processor = ImageProcessor(self.template_path, background_color)
+            max_megapixels = self.config_manager.get("max_image_megapixels", 100)
+            self.processor = ImageProcessor(
+                self.template_path,
+                background_color,
+                self.cell_cache,
+                int(max_megapixels * 1000000) or None,
+                self.stage_timer,
+                self.LAYER_CACHE_SIZE
+            )
         except FileNotFoundError as e:
             QMessageBox.critical(self, "错误", f"无法加载模板图片:\n{str(e)}")
     
@@ -642,6 +754,14 @@ class MainWindow(QMainWindow):
         self.save_btn.setEnabled(False)
         operation_layout.addWidget(self.save_btn)
         
+        self.cancel_btn = QPushButton("取消处理")
+        self.cancel_btn.setMinimumHeight(40)
+        self.cancel_btn.setFont(QFont("Microsoft YaHei", 10))
+        self.cancel_btn.setStyleSheet(button_style)
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setEnabled(False)
+        operation_layout.addWidget(self.cancel_btn)
+        
         self.status_label = QLabel("请上传壁纸图片")
         self.status_label.setStyleSheet("color: #c3d0cb; padding: 5px; font-size: 13px;")
         operation_layout.addWidget(self.status_label)
@@ -867,11 +987,19 @@ class MainWindow(QMainWindow):
         self.radio_format_jpg = QRadioButton("JPG")
         self.radio_format_jpg.setStyleSheet("color: #c3d0cb; font-size: 13px;")
         self.format_group.addButton(self.radio_format_jpg)
+        self.radio_format_jpg.toggled.connect(self.auto_save_settings)
         format_hlayout.addWidget(self.radio_format_jpg)
         
+        self.radio_format_webp = QRadioButton("WebP")
+        self.radio_format_webp.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.format_group.addButton(self.radio_format_webp)
+        format_hlayout.addWidget(self.radio_format_webp)
+        
         current_format = self.config_manager.get("save_format", "PNG")
         if current_format == "PNG":
             self.radio_format_png.setChecked(True)
+        elif current_format == "WEBP":
+            self.radio_format_webp.setChecked(True)
         else:
             self.radio_format_jpg.setChecked(True)
         
@@ -924,6 +1052,86 @@ class MainWindow(QMainWindow):
         
         save_layout.addLayout(quality_hlayout)
         
+        preset_hlayout = QHBoxLayout()
+        preset_label = QLabel("保存预设:")
+        preset_label.setStyleSheet(label_style)
+        preset_label.setFixedWidth(180)
+        preset_hlayout.addWidget(preset_label)
+        
+        self.preset_group = QButtonGroup()
+        self.preset_radios = {}
+        preset_texts = {
+            "fast": "快速（编码最快，文件较大）",
+            "balanced": "均衡",
+            "smallest": "最小体积（编码最慢）",
+        }
+        current_preset = self.config_manager.get("save_preset", ImageProcessor.DEFAULT_SAVE_PRESET)
+        for preset, text in preset_texts.items():
+            radio = QRadioButton(text)
+            radio.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+            radio.setChecked(preset == current_preset)
+            radio.toggled.connect(self.auto_save_settings)
+            self.preset_group.addButton(radio)
+            self.preset_radios[preset] = radio
+            preset_hlayout.addWidget(radio)
+        
+        preset_hlayout.addStretch()
+        save_layout.addLayout(preset_hlayout)
+        
+        palette_hlayout = QHBoxLayout()
+        palette_label = QLabel("PNG 调色板量化:")
+        palette_label.setStyleSheet(label_style)
+        palette_label.setFixedWidth(180)
+        palette_hlayout.addWidget(palette_label)
+        
+        self.palette_group = QButtonGroup()
+        
+        self.radio_palette_yes = QRadioButton("是（256 色，有损，文件明显更小）")
+        self.radio_palette_yes.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.palette_group.addButton(self.radio_palette_yes)
+        self.radio_palette_yes.toggled.connect(self.auto_save_settings)
+        palette_hlayout.addWidget(self.radio_palette_yes)
+        
+        self.radio_palette_no = QRadioButton("否")
+        self.radio_palette_no.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.palette_group.addButton(self.radio_palette_no)
+        palette_hlayout.addWidget(self.radio_palette_no)
+        
+        if self.config_manager.get("save_png_palette", False):
+            self.radio_palette_yes.setChecked(True)
+        else:
+            self.radio_palette_no.setChecked(True)
+        
+        palette_hlayout.addStretch()
+        save_layout.addLayout(palette_hlayout)
+        
+        lossless_hlayout = QHBoxLayout()
+        lossless_label = QLabel("WebP 无损压缩:")
+        lossless_label.setStyleSheet(label_style)
+        lossless_label.setFixedWidth(180)
+        lossless_hlayout.addWidget(lossless_label)
+        
+        self.lossless_group = QButtonGroup()
+        
+        self.radio_lossless_yes = QRadioButton("是（保存质量表示压缩力度）")
+        self.radio_lossless_yes.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.lossless_group.addButton(self.radio_lossless_yes)
+        self.radio_lossless_yes.toggled.connect(self.auto_save_settings)
+        lossless_hlayout.addWidget(self.radio_lossless_yes)
+        
+        self.radio_lossless_no = QRadioButton("否")
+        self.radio_lossless_no.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.lossless_group.addButton(self.radio_lossless_no)
+        lossless_hlayout.addWidget(self.radio_lossless_no)
+        
+        if self.config_manager.get("webp_lossless", False):
+            self.radio_lossless_yes.setChecked(True)
+        else:
+            self.radio_lossless_no.setChecked(True)
+        
+        lossless_hlayout.addStretch()
+        save_layout.addLayout(lossless_hlayout)
+        
         save_group.setLayout(save_layout)
         scroll_layout.addWidget(save_group)
         
@@ -967,6 +1175,155 @@ class MainWindow(QMainWindow):
         canvas_group.setLayout(canvas_layout)
         scroll_layout.addWidget(canvas_group)
         
+        performance_group = QGroupBox("性能设置")
+        performance_group.setStyleSheet(groupbox_style)
+        performance_layout = QVBoxLayout()
+        performance_layout.setSpacing(15)
+        
+        workers_hlayout = QHBoxLayout()
+        workers_label = QLabel("并行处理线程数:")
+        workers_label.setStyleSheet(label_style)
+        workers_label.setFixedWidth(180)
+        workers_hlayout.addWidget(workers_label)
+        
+        self.workers_input = QSpinBox()
+        self.workers_input.setMinimum(0)
+        self.workers_input.setMaximum(64)
+        self.workers_input.setSpecialValueText("自动")
+        self.workers_input.setValue(self.config_manager.get("process_workers", 0))
+        self.workers_input.setFixedWidth(150)
+        self.workers_input.setStyleSheet("""
+            QSpinBox {
+                background-color: #2b2d30;
+                color: #c3d0cb;
+                border: 1px solid #555555;
+                border-radius: 4px;
+                padding: 6px;
+                font-size: 12px;
+            }
+        """)
+        self.workers_input.valueChanged.connect(self.auto_save_settings)
+        workers_hlayout.addWidget(self.workers_input)
+        
+        workers_hint = QLabel(f"自动 = 使用全部 {os.cpu_count() or 1} 个 CPU 核心")
+        workers_hint.setStyleSheet("color: #888888; font-size: 12px;")
+        workers_hlayout.addWidget(workers_hint)
+        
+        workers_hlayout.addStretch()
+        performance_layout.addLayout(workers_hlayout)
+        
+        max_pixels_hlayout = QHBoxLayout()
+        max_pixels_label = QLabel("单张图片像素上限:")
+        max_pixels_label.setStyleSheet(label_style)
+        max_pixels_label.setFixedWidth(180)
+        max_pixels_hlayout.addWidget(max_pixels_label)
+        
+        self.max_pixels_input = QSpinBox()
+        self.max_pixels_input.setMinimum(0)
+        self.max_pixels_input.setMaximum(1000)
+        self.max_pixels_input.setSuffix(" MP")
+        self.max_pixels_input.setSpecialValueText("不限制")
+        self.max_pixels_input.setValue(int(self.config_manager.get("max_image_megapixels", 100)))
+        self.max_pixels_input.setFixedWidth(150)
+        self.max_pixels_input.setStyleSheet(self.workers_input.styleSheet())
+        self.max_pixels_input.valueChanged.connect(self.on_max_pixels_changed)
+        max_pixels_hlayout.addWidget(self.max_pixels_input)
+        
+        max_pixels_hint = QLabel("JPEG 会先按需降采样解码，再按解码后的尺寸检查")
+        max_pixels_hint.setStyleSheet("color: #888888; font-size: 12px;")
+        max_pixels_hlayout.addWidget(max_pixels_hint)
+        
+        max_pixels_hlayout.addStretch()
+        performance_layout.addLayout(max_pixels_hlayout)
+        
+        cache_hlayout = QHBoxLayout()
+        cache_label = QLabel("格子缓存文件夹:")
+        cache_label.setStyleSheet(label_style)
+        cache_label.setFixedWidth(180)
+        cache_hlayout.addWidget(cache_label)
+        
+        self.cache_folder_input = QLineEdit()
+        self.cache_folder_input.setStyleSheet(input_style)
+        self.cache_folder_input.setReadOnly(True)
+        self.cache_folder_input.setText(self.config_manager.get("cell_cache_dir", ""))
+        cache_hlayout.addWidget(self.cache_folder_input)
+        
+        cache_browse_btn = QPushButton("浏览")
+        cache_browse_btn.setStyleSheet(button_style)
+        cache_browse_btn.setFixedWidth(80)
+        cache_browse_btn.clicked.connect(self.browse_cache_folder)
+        cache_hlayout.addWidget(cache_browse_btn)
+        
+        cache_clear_btn = QPushButton("清空缓存")
+        cache_clear_btn.setStyleSheet(button_style)
+        cache_clear_btn.setFixedWidth(100)
+        cache_clear_btn.clicked.connect(self.clear_cell_cache)
+        cache_hlayout.addWidget(cache_clear_btn)
+        performance_layout.addLayout(cache_hlayout)
+        
+        fast_preview_hlayout = QHBoxLayout()
+        fast_preview_label = QLabel("快速预览:")
+        fast_preview_label.setStyleSheet(label_style)
+        fast_preview_label.setFixedWidth(180)
+        fast_preview_hlayout.addWidget(fast_preview_label)
+        
+        self.fast_preview_group = QButtonGroup()
+        
+        self.radio_fast_preview_yes = QRadioButton("是（按预览区分辨率处理，保存时再生成全分辨率图片）")
+        self.radio_fast_preview_yes.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.fast_preview_group.addButton(self.radio_fast_preview_yes)
+        self.radio_fast_preview_yes.toggled.connect(self.auto_save_settings)
+        fast_preview_hlayout.addWidget(self.radio_fast_preview_yes)
+        
+        self.radio_fast_preview_no = QRadioButton("否")
+        self.radio_fast_preview_no.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.fast_preview_group.addButton(self.radio_fast_preview_no)
+        fast_preview_hlayout.addWidget(self.radio_fast_preview_no)
+        
+        if self.config_manager.get("fast_preview", True):
+            self.radio_fast_preview_yes.setChecked(True)
+        else:
+            self.radio_fast_preview_no.setChecked(True)
+        
+        fast_preview_hlayout.addStretch()
+        performance_layout.addLayout(fast_preview_hlayout)
+        
+        stage_timing_hlayout = QHBoxLayout()
+        stage_timing_label = QLabel("记录各阶段耗时:")
+        stage_timing_label.setStyleSheet(label_style)
+        stage_timing_label.setFixedWidth(180)
+        stage_timing_hlayout.addWidget(stage_timing_label)
+        
+        self.stage_timing_group = QButtonGroup()
+        
+        self.radio_stage_timing_yes = QRadioButton("是")
+        self.radio_stage_timing_yes.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.stage_timing_group.addButton(self.radio_stage_timing_yes)
+        self.radio_stage_timing_yes.toggled.connect(self.on_stage_timing_toggled)
+        stage_timing_hlayout.addWidget(self.radio_stage_timing_yes)
+        
+        self.radio_stage_timing_no = QRadioButton("否")
+        self.radio_stage_timing_no.setStyleSheet("color: #c3d0cb; font-size: 13px;")
+        self.stage_timing_group.addButton(self.radio_stage_timing_no)
+        stage_timing_hlayout.addWidget(self.radio_stage_timing_no)
+        
+        if self.stage_timer is not None:
+            self.radio_stage_timing_yes.setChecked(True)
+        else:
+            self.radio_stage_timing_no.setChecked(True)
+        
+        stage_stats_btn = QPushButton("查看统计")
+        stage_stats_btn.setStyleSheet(button_style)
+        stage_stats_btn.setFixedWidth(100)
+        stage_stats_btn.clicked.connect(self.show_stage_stats)
+        stage_timing_hlayout.addWidget(stage_stats_btn)
+        
+        stage_timing_hlayout.addStretch()
+        performance_layout.addLayout(stage_timing_hlayout)
+        
+        performance_group.setLayout(performance_layout)
+        scroll_layout.addWidget(performance_group)
+        
         scroll_layout.addStretch()
         
         scroll_area.setWidget(scroll_widget)
@@ -1063,6 +1420,17 @@ class MainWindow(QMainWindow):
         """关闭窗口"""
         self.close()
     
+    def closeEvent(self, event):
+        """窗口关闭事件，等待后台处理线程退出"""
+        for worker in self.findChildren((ProcessWorker, ThumbnailWorker, ProbeWorker)):
+            worker.cancel()
+            worker.wait()
+        # 已提交的保存任务全部写完后再退出
+        if self.save_worker.isRunning():
+            self.save_worker.finish()
+            self.save_worker.wait()
+        super().closeEvent(event)
+    
     def mousePressEvent(self, event):
         """鼠标按下事件"""
         if event.button() == Qt.LeftButton:
@@ -1147,31 +1515,117 @@ class MainWindow(QMainWindow):
         """处理图片删除事件"""
         if 0 <= index < len(self.uploaded_images):
             removed_file = self.uploaded_images.pop(index)
+            self.image_info.pop(removed_file, None)
             self.update_image_count()
             self.update_preview_grid()
             self.status_label.setText(f"已删除: {os.path.basename(removed_file)}")
     
     def add_images_to_list(self, file_paths):
-        """将图片添加到列表"""
-        added_count = 0
+        """
+        将图片添加到列表
+        
+        在后台线程池中只读取文件头校验图片，校验通过的图片按选择顺序逐个加入列表
+        
+        @param file_paths: 图片路径列表
+        """
+        if self.processor is None:
+            QMessageBox.warning(self, "警告", "图片处理器未初始化，无法添加图片")
+            return
+        
+        new_paths = []
         for file_path in file_paths:
-            if file_path not in self.uploaded_images:
-                try:
-                    pixmap = QPixmap(file_path)
-                    if not pixmap.isNull():
-                        self.uploaded_images.append(file_path)
-                        added_count += 1
-                except Exception as e:
-                    QMessageBox.warning(self, "警告", f"无法加载图片 {file_path}:\n{str(e)}")
+            if file_path not in self.uploaded_images and file_path not in self.probing_paths:
+                self.probing_paths.add(file_path)
+                new_paths.append(file_path)
+        if not new_paths:
+            return
+        
+        if len(self.probing_paths) == len(new_paths):
+            self.probe_added_count = 0
+            self.probe_failures = []
+        
+        worker = ProbeWorker(self.processor, new_paths, self.probe_generation, self)
+        worker.probed.connect(self.on_image_probed)
+        worker.probe_failed.connect(self.on_image_probe_failed)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+        self.status_label.setText(f"正在检查 {len(self.probing_paths)} 张图片...")
+    
+    def on_image_probed(self, generation, file_path, info):
+        """
+        图片文件头校验通过
         
-        if added_count > 0:
+        @param generation: 校验批次，与当前批次不一致时丢弃
+        @param file_path: 图片路径
+        @param info: probe_image 返回的图片信息字典
+        """
+        if generation != self.probe_generation:
+            return
+        self.probing_paths.discard(file_path)
+        if file_path not in self.uploaded_images:
+            self.uploaded_images.append(file_path)
+            self.image_info[file_path] = info
+            self.probe_added_count += 1
             self.update_image_count()
-            self.update_preview_grid()
-            self.status_label.setText(f"成功添加 {added_count} 张图片")
+            self.preview_refresh_timer.start()
+        self.update_probe_status()
+    
+    def on_image_probe_failed(self, generation, file_path, message, too_large):
+        """
+        图片文件头校验失败
+        
+        @param generation: 校验批次
+        @param file_path: 图片路径
+        @param message: 错误信息
+        @param too_large: 是否因像素数超过上限被拒绝
+        """
+        if generation != self.probe_generation:
+            return
+        self.probing_paths.discard(file_path)
+        self.probe_failures.append((file_path, message, too_large))
+        self.update_probe_status()
+    
+    def update_probe_status(self):
+        """在状态栏显示上传校验进度，全部校验完成后列出被跳过的图片及原因"""
+        if self.probing_paths:
+            self.status_label.setText(
+                f"已添加 {self.probe_added_count} 张图片，正在检查 {len(self.probing_paths)} 张..."
+            )
+            return
+        message = f"成功添加 {self.probe_added_count} 张图片"
+        too_large_count = sum(1 for _, _, too_large in self.probe_failures if too_large)
+        if too_large_count:
+            max_pixels = self.processor.max_pixels if self.processor else None
+            limit = f"（{max_pixels / 1e6:.0f} MP）" if max_pixels else ""
+            message += f"，跳过 {too_large_count} 张超过像素上限{limit}的图片"
+        if len(self.probe_failures) > too_large_count:
+            message += f"，跳过 {len(self.probe_failures) - too_large_count} 张无法识别的图片"
+        self.status_label.setText(message)
+        
+        if self.probe_failures:
+            details = "\n".join(
+                f"{os.path.basename(path)}: {reason}"
+                for path, reason, _ in self.probe_failures[:self.PROBE_FAILURE_DETAILS]
+            )
+            if len(self.probe_failures) > self.PROBE_FAILURE_DETAILS:
+                details += f"\n... 等共 {len(self.probe_failures)} 张"
+            if too_large_count:
+                details += "\n\n可在设置页调高“单张图片像素上限”后重新添加"
+            self.probe_failures = []
+            QMessageBox.warning(self, "部分图片未添加", details)
     
     def clear_images(self):
         """清空图片列表"""
+        if self.process_worker is not None:
+            self.process_worker.cancel()
+            self.finish_processing()
+        self.probe_generation += 1
+        for worker in self.findChildren(ProbeWorker):
+            worker.cancel()
+        self.probing_paths.clear()
+        self.preview_refresh_timer.stop()
         self.uploaded_images.clear()
+        self.image_info.clear()
         self.update_image_count()
         self.original_preview.set_images([], self.current_layout)
         self.preview_label.clear()
@@ -1190,7 +1644,7 @@ class MainWindow(QMainWindow):
         self.image_count_label.setText(f"已上传: {current_count} 张 | 需要: {required_count} 张")
         
         if current_count == required_count:
-            self.process_btn.setEnabled(True)
+            self.process_btn.setEnabled(not self.is_processing())
             self.image_count_label.setStyleSheet("color: #00FF00; padding: 10px; font-size: 14px;")
         elif current_count > 0:
             self.process_btn.setEnabled(False)
@@ -1203,6 +1657,33 @@ class MainWindow(QMainWindow):
         """更新原始图片网格预览"""
         self.original_preview.set_images(self.uploaded_images, self.current_layout)
     
+    def find_oversized_images(self):
+        """
+        用上传时读取的文件头信息检查图片是否超过当前的像素数上限
+        
+        像素上限可能在上传后被修改，因此处理前按当时的设置重新检查，不需要再次打开文件；
+        文件在上传后被修改过时丢弃旧信息，由处理流程解码时再检查
+        
+        @return: 超过上限的图片路径列表
+        """
+        oversized = []
+        for path in self.uploaded_images:
+            info = self.image_info.get(path)
+            if info is None:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != info["mtime_ns"]:
+                del self.image_info[path]
+                continue
+            try:
+                self.processor.check_pixel_count(self.processor.decode_size(info))
+            except ValueError:
+                oversized.append(path)
+        return oversized
+    
     def process_images(self):
         """处理多图片"""
         rows, cols = self.current_layout
@@ -1216,47 +1697,303 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "图片处理器未初始化")
             return
         
+        oversized = self.find_oversized_images()
+        if oversized:
+            names = "\n".join(os.path.basename(path) for path in oversized)
+            QMessageBox.warning(self, "警告", f"以下图片超过当前的像素上限，请删除后再处理:\n{names}")
+            return
+        
+        self.processed_image = None
+        if self.stage_timer is not None:
+            self.stage_timer.reset()
+        self.save_btn.setEnabled(False)
+        self.process_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_label.setText("正在处理图片...")
+        self.init_result_preview(rows, cols)
+        
+        # 快速预览在显示分辨率上处理，全分辨率结果留到保存时再生成
+        processor = self.processor
+        self.full_render_source = None
+        if self.config_manager.get("fast_preview", True):
+            processor = self.get_preview_processor(rows, cols)
+            if processor is not self.processor:
+                self.full_render_source = (self.processor, list(self.uploaded_images), self.current_layout)
+        
+        # 已处理过的格子直接复用；布局不变时只把变化的格子贴入上一次的网格
+        self.processing_keys = [self.cell_result_key(processor, path) for path in self.uploaded_images]
+        cached_cells = []
+        for key in self.processing_keys:
+            cell = self.cell_results.get(key)
+            if cell is not None:
+                self.cell_results.move_to_end(key)
+            cached_cells.append(cell)
+        
+        base_grid = None
+        changed_indices = None
+        if self.last_grid is not None and required_count > 1:
+            last_layout, last_settings, last_keys, last_image = self.last_grid
+            # 预览比例、快速预览开关或背景色变化后格子尺寸或内容全部不同，不能在旧网格上更新
+            if last_layout == self.current_layout and last_settings == processor.cache_settings():
+                base_grid = last_image
+                changed_indices = {
+                    idx for idx, key in enumerate(self.processing_keys) if key != last_keys[idx]
+                }
+        
+        # 全分辨率处理时先用快速滤镜生成草稿显示，正式结果完成后逐格替换；草稿只用于显示，不进入缓存和保存。
+        # 快速预览本身已在显示分辨率上处理，JPEG 已按最大倍数降采样解码，草稿不会更快
+        draft_processor = None
+        if self.config_manager.get("progressive_preview", True) and self.full_render_source is None:
+            draft_processor = processor.draft()
+        
+        worker = ProcessWorker(
+            processor,
+            self.uploaded_images,
+            self.current_layout,
+            self.config_manager.get("process_workers", 0),
+            self,
+            cached_cells,
+            base_grid,
+            changed_indices,
+            draft_processor
+        )
+        worker.progress.connect(self.on_process_progress)
+        worker.draft_ready.connect(self.on_draft_ready)
+        worker.cell_ready.connect(self.on_cell_ready)
+        worker.result_ready.connect(self.on_process_finished)
+        worker.failed.connect(self.on_process_failed)
+        worker.cancelled.connect(self.on_process_cancelled)
+        worker.finished.connect(worker.deleteLater)
+        self.process_worker = worker
+        worker.start()
+    
+    def cell_result_key(self, processor, image_path):
+        """
+        生成格子结果缓存键，源图被替换（修改时间变化）或处理参数（含预览尺寸）变化时键随之变化
+        
+        @param processor: 处理该格子的 ImageProcessor 实例
+        @param image_path: 源图路径
+        @return: 可哈希的缓存键
+        """
         try:
-            self.status_label.setText("正在处理图片...")
-            self.process_btn.setEnabled(False)
-            
-            processed_images = []
-            for idx, img_path in enumerate(self.uploaded_images):
-                self.status_label.setText(f"正在处理第 {idx + 1}/{required_count} 张图片...")
-                processed_img = self.processor.process_wallpaper(img_path)
-                processed_images.append(processed_img)
-            
-            if rows == 1 and cols == 1:
-                self.processed_image = processed_images[0]
-            else:
-                self.status_label.setText("正在拼接图片...")
-                self.processed_image = self.processor.create_grid_layout(processed_images, rows, cols)
-            
-            temp_path = "temp_preview.png"
-            self.processor.save_result(self.processed_image, temp_path, "PNG", 95)
-            
-            pixmap = QPixmap(temp_path)
-            if not pixmap.isNull():
-                scaled_pixmap = pixmap.scaled(
-                    self.preview_label.width(),
-                    self.preview_label.height(),
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.preview_label.setPixmap(scaled_pixmap)
-                self.preview_label.setText("")
-            
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
-            self.save_btn.setEnabled(True)
-            self.process_btn.setEnabled(True)
+            mtime = os.stat(image_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return (image_path, mtime, processor.cache_settings())
+    
+    def preview_scale(self, rows, cols):
+        """
+        计算整张结果缩放到预览区时的比例
+        
+        @param rows: 行数
+        @param cols: 列数
+        @return: 缩放比例（逻辑像素）
+        """
+        return min(
+            self.preview_label.width() / (cols * ImageProcessor.TEMPLATE_WIDTH),
+            self.preview_label.height() / (rows * ImageProcessor.TEMPLATE_HEIGHT)
+        )
+    
+    def get_preview_processor(self, rows, cols):
+        """
+        获取按预览区分辨率处理的预览处理器，比例不变时复用，保留其图层缓存
+        
+        @param rows: 行数
+        @param cols: 列数
+        @return: ImageProcessor 实例，预览区不小于全分辨率时返回 self.processor
+        """
+        # 按设备像素比换算为物理像素，高分屏上预览仍然清晰
+        scale = self.preview_scale(rows, cols) * self.preview_label.devicePixelRatioF()
+        scale = math.ceil(scale / self.PREVIEW_SCALE_STEP) * self.PREVIEW_SCALE_STEP
+        source = (self.processor, scale)
+        if self.preview_processor_source != source:
+            self.preview_processor = self.processor.scaled(scale)
+            self.preview_processor_source = source
+        return self.preview_processor
+    
+    def store_cell_result(self, key, image):
+        """
+        缓存单个格子的处理结果，超出容量时淘汰最久未使用的格子
+        
+        容量为当前布局的格子数再加 CELL_RESULT_EXTRA，保证当前网格的格子都留在缓存中
+        
+        @param key: cell_result_key 返回的缓存键
+        @param image: 处理后的 PIL Image 对象
+        """
+        self.cell_results[key] = image
+        self.cell_results.move_to_end(key)
+        rows, cols = self.current_layout
+        while len(self.cell_results) > rows * cols + self.CELL_RESULT_EXTRA:
+            self.cell_results.popitem(last=False)
+    
+    def is_processing(self):
+        """
+        是否有正在运行的处理任务
+        
+        @return: 正在处理返回 True
+        """
+        return self.process_worker is not None
+    
+    def cancel_processing(self):
+        """取消正在运行的处理任务"""
+        if self.process_worker is None:
+            return
+        self.process_worker.cancel()
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("正在取消处理...")
+    
+    def finish_processing(self):
+        """处理任务结束后恢复按钮状态"""
+        self.process_worker = None
+        self.cancel_btn.setEnabled(False)
+        self.update_image_count()
+    
+    def init_result_preview(self, rows, cols):
+        """
+        按预览区尺寸创建结果预览画布，处理完成的格子会逐个绘制到其中
+        
+        @param rows: 行数
+        @param cols: 列数
+        """
+        sheet_width = cols * ImageProcessor.TEMPLATE_WIDTH
+        sheet_height = rows * ImageProcessor.TEMPLATE_HEIGHT
+        scale = self.preview_scale(rows, cols)
+        
+        pixmap = QPixmap(max(1, int(sheet_width * scale)), max(1, int(sheet_height * scale)))
+        pixmap.fill(QColor(self.config_manager.get("canvas_background_color", "#000000")))
+        self.result_preview_pixmap = pixmap
+        self.result_preview_scale = scale
+        self.preview_label.setPixmap(pixmap)
+        self.preview_label.setText("")
+    
+    def on_cell_ready(self, index, image):
+        """
+        单张图片处理完成，将其绘制到结果预览对应的格子中
+        
+        @param index: 图片序号
+        @param image: 处理后的 PIL Image 对象
+        """
+        if self.sender() is not self.process_worker:
+            return
+        self.store_cell_result(self.processing_keys[index], image)
+        self.draw_preview_cell(index, image)
+    
+    def on_draft_ready(self, index, image):
+        """
+        单个格子的草稿生成完成，先绘制到结果预览中，正式结果完成后会被覆盖
+        
+        @param index: 图片序号
+        @param image: 草稿 PIL Image 对象
+        """
+        if self.sender() is not self.process_worker:
+            return
+        self.draw_preview_cell(index, image)
+    
+    def draw_preview_cell(self, index, image):
+        """
+        将单个格子绘制到结果预览对应的位置
+        
+        @param index: 图片序号
+        @param image: 格子 PIL Image 对象
+        """
+        if self.result_preview_pixmap is None:
+            return
+        
+        cols = self.current_layout[1]
+        scale = self.result_preview_scale
+        x = round((index % cols) * ImageProcessor.TEMPLATE_WIDTH * scale)
+        y = round((index // cols) * ImageProcessor.TEMPLATE_HEIGHT * scale)
+        right = round((index % cols + 1) * ImageProcessor.TEMPLATE_WIDTH * scale)
+        bottom = round((index // cols + 1) * ImageProcessor.TEMPLATE_HEIGHT * scale)
+        
+        painter = QPainter(self.result_preview_pixmap)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(QRect(x, y, right - x, bottom - y), pil_to_qimage(image))
+        painter.end()
+        
+        self.preview_label.setPixmap(self.result_preview_pixmap)
+    
+    def on_process_progress(self, done, total):
+        """
+        处理进度更新
+        
+        @param done: 已完成数量
+        @param total: 总数量
+        """
+        if self.sender() is not self.process_worker:
+            return
+        if done < total:
+            self.status_label.setText(f"正在处理图片，已完成 {done}/{total} 张...")
+        elif total > 1:
+            self.status_label.setText("正在拼接图片...")
+    
+    def on_process_finished(self, result):
+        """
+        处理任务完成
+        
+        @param result: 处理后的 PIL Image 对象
+        """
+        if self.sender() is not self.process_worker:
+            return
+        self.processed_image = result
+        self.last_grid = (
+            self.process_worker.layout_grid,
+            self.process_worker.processor.cache_settings(),
+            self.processing_keys,
+            result
+        )
+        self.finish_processing()
+        self.save_btn.setEnabled(True)
+        if self.full_render_source is not None:
+            self.status_label.setText("预览完成！保存时将生成全分辨率图片")
+        else:
             self.status_label.setText("处理完成！可以保存图片了")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"处理图片失败:\n{str(e)}")
-            self.process_btn.setEnabled(True)
-            self.status_label.setText("处理失败")
+    
+    def get_stage_stats(self):
+        """
+        获取最近一次处理（及之后保存）的各阶段耗时统计
+        
+        需要在设置页开启"记录各阶段耗时"（配置项 stage_timing_enabled）
+        
+        @return: StageTimer.stats() 的结果，未开启计时时返回空字典
+        """
+        if self.stage_timer is None:
+            return {}
+        return self.stage_timer.stats()
+    
+    def show_stage_stats(self):
+        """显示最近一次处理（及之后保存）的各阶段耗时统计"""
+        if self.stage_timer is None:
+            QMessageBox.information(self, "阶段耗时", "尚未开启\"记录各阶段耗时\"")
+            return
+        if not self.get_stage_stats():
+            QMessageBox.information(self, "阶段耗时", "暂无记录，处理或保存图片后再查看")
+            return
+        message_box = QMessageBox(self)
+        message_box.setWindowTitle("阶段耗时")
+        message_box.setTextFormat(Qt.PlainText)
+        message_box.setText(self.stage_timer.format_stats())
+        message_box.setFont(QFont("monospace"))
+        message_box.exec_()
+    
+    def on_process_failed(self, message):
+        """
+        处理任务失败
+        
+        @param message: 错误信息
+        """
+        if self.sender() is not self.process_worker:
+            return
+        self.finish_processing()
+        QMessageBox.critical(self, "错误", f"处理图片失败:\n{message}")
+        self.status_label.setText("处理失败")
+    
+    def on_process_cancelled(self):
+        """处理任务已取消"""
+        if self.sender() is not self.process_worker:
+            return
+        self.finish_processing()
+        self.status_label.setText("已取消处理")
     
     def browse_source_folder(self):
         """浏览选择原始图片文件夹"""
@@ -1280,6 +2017,25 @@ class MainWindow(QMainWindow):
             self.output_folder_input.setText(folder)
             self.auto_save_settings()
     
+    def browse_cache_folder(self):
+        """浏览选择格子缓存文件夹"""
+        folder = QFileDialog.getExistingDirectory(
+            self,
+            "选择格子缓存文件夹",
+            self.cache_folder_input.text()
+        )
+        if folder:
+            self.cache_folder_input.setText(folder)
+            self.auto_save_settings()
+            self.cell_cache = create_cell_cache(self.config_manager)
+            self.init_processor()
+    
+    def clear_cell_cache(self):
+        """清空格子缓存"""
+        if self.cell_cache is not None:
+            self.cell_cache.clear()
+        self.status_label.setText("已清空格子缓存")
+    
     def choose_canvas_color(self):
         """选择画布背景颜色"""
         current_color = self.config_manager.get("canvas_background_color", "#000000")
@@ -1295,11 +2051,28 @@ class MainWindow(QMainWindow):
             """)
             self.config_manager.set("canvas_background_color", color_hex)
             self.config_manager.save_config()
-            self.init_processor()
+            if self.processor is None:
+                self.init_processor()
+                return
+            # 沿用已加载的模板和壁纸图层，只需按新背景色重新合成
+            old_processor = self.processor
+            self.processor = old_processor.with_background_color(color_hex)
+            if self.preview_processor_source is not None:
+                if self.preview_processor is old_processor:
+                    self.preview_processor = self.processor
+                else:
+                    self.preview_processor = self.preview_processor.with_background_color(color_hex)
+                self.preview_processor_source = (self.processor, self.preview_processor_source[1])
+            rows, cols = self.current_layout
+            if (self.processed_image is not None and not self.is_processing()
+                    and len(self.uploaded_images) == rows * cols):
+                self.process_images()
     
     def auto_save_settings(self):
         """自动保存设置"""
-        if not hasattr(self, 'radio_format_png') or not hasattr(self, 'quality_slider'):
+        if not hasattr(self, 'radio_format_png') or not hasattr(self, 'radio_stage_timing_no'):
+            return
+        if self._resetting_settings:
             return
         
         self.config_manager.set("source_image_folder", self.source_folder_input.text())
@@ -1313,10 +2086,22 @@ class MainWindow(QMainWindow):
         
         if self.radio_format_png.isChecked():
             self.config_manager.set("save_format", "PNG")
+        elif self.radio_format_webp.isChecked():
+            self.config_manager.set("save_format", "WEBP")
         else:
             self.config_manager.set("save_format", "JPG")
         
         self.config_manager.set("save_quality", self.quality_slider.value())
+        for preset, radio in self.preset_radios.items():
+            if radio.isChecked():
+                self.config_manager.set("save_preset", preset)
+        self.config_manager.set("save_png_palette", self.radio_palette_yes.isChecked())
+        self.config_manager.set("webp_lossless", self.radio_lossless_yes.isChecked())
+        self.config_manager.set("process_workers", self.workers_input.value())
+        self.config_manager.set("max_image_megapixels", self.max_pixels_input.value())
+        self.config_manager.set("cell_cache_dir", self.cache_folder_input.text())
+        self.config_manager.set("fast_preview", self.radio_fast_preview_yes.isChecked())
+        self.config_manager.set("stage_timing_enabled", self.radio_stage_timing_yes.isChecked())
         
         self.config_manager.save_config()
     
@@ -1325,6 +2110,25 @@ class MainWindow(QMainWindow):
         self.radio_timestamp.setEnabled(checked)
         self.radio_sequence.setEnabled(checked)
     
+    def on_stage_timing_toggled(self, checked):
+        """阶段耗时记录开关切换，关闭时处理器不再计时"""
+        self.auto_save_settings()
+        if checked == (self.stage_timer is not None):
+            return
+        self.stage_timer = StageTimer() if checked else None
+        if self.processor:
+            self.processor.stage_timer = self.stage_timer
+        if self.preview_processor:
+            self.preview_processor.stage_timer = self.stage_timer
+    
+    def on_max_pixels_changed(self, value):
+        """像素上限改变"""
+        self.auto_save_settings()
+        if self.processor:
+            self.processor.max_pixels = value * 1000000 or None
+        if self.preview_processor:
+            self.preview_processor.max_pixels = value * 1000000 or None
+    
     def on_quality_changed(self, value):
         """保存质量滑块值改变"""
         self.quality_label.setText(f"保存质量: {value}")
@@ -1341,41 +2145,77 @@ class MainWindow(QMainWindow):
         
         if reply == QMessageBox.Yes:
             self.config_manager.reset_to_default()
+            # 控件的信号会触发 auto_save_settings，全部控件恢复完之前不写回配置
+            self._resetting_settings = True
+            try:
+                self.apply_settings_to_widgets()
+            finally:
+                self._resetting_settings = False
+            self.auto_save_settings()
             
-            self.source_folder_input.setText(self.config_manager.get("source_image_folder", ""))
-            self.output_folder_input.setText(self.config_manager.get("output_image_folder", ""))
-            
-            if self.config_manager.get("silent_save", False):
-                self.radio_silent_yes.setChecked(True)
-            else:
-                self.radio_silent_no.setChecked(True)
-            
-            current_pattern = self.config_manager.get("filename_pattern", "timestamp")
-            if current_pattern == "timestamp":
-                self.radio_timestamp.setChecked(True)
-            else:
-                self.radio_sequence.setChecked(True)
-            
-            current_format = self.config_manager.get("save_format", "PNG")
-            if current_format == "PNG":
-                self.radio_format_png.setChecked(True)
-            else:
-                self.radio_format_jpg.setChecked(True)
-            
-            self.quality_slider.setValue(self.config_manager.get("save_quality", 95))
-            
-            canvas_color = self.config_manager.get("canvas_background_color", "#000000")
-            self.canvas_color_input.setText(canvas_color)
-            self.canvas_color_preview.setStyleSheet(f"""
-                background-color: {canvas_color};
-                border: 1px solid #555555;
-                border-radius: 4px;
-            """)
-            
+            self.cell_cache = create_cell_cache(self.config_manager)
             self.init_processor()
             
             QMessageBox.information(self, "成功", "已恢复默认设置")
     
+    def apply_settings_to_widgets(self):
+        """按当前配置更新设置页的全部控件"""
+        self.source_folder_input.setText(self.config_manager.get("source_image_folder", ""))
+        self.output_folder_input.setText(self.config_manager.get("output_image_folder", ""))
+        
+        if self.config_manager.get("silent_save", False):
+            self.radio_silent_yes.setChecked(True)
+        else:
+            self.radio_silent_no.setChecked(True)
+        
+        current_pattern = self.config_manager.get("filename_pattern", "timestamp")
+        if current_pattern == "timestamp":
+            self.radio_timestamp.setChecked(True)
+        else:
+            self.radio_sequence.setChecked(True)
+        
+        current_format = self.config_manager.get("save_format", "PNG")
+        if current_format == "PNG":
+            self.radio_format_png.setChecked(True)
+        elif current_format == "WEBP":
+            self.radio_format_webp.setChecked(True)
+        else:
+            self.radio_format_jpg.setChecked(True)
+        
+        self.quality_slider.setValue(self.config_manager.get("save_quality", 95))
+        current_preset = self.config_manager.get("save_preset", ImageProcessor.DEFAULT_SAVE_PRESET)
+        self.preset_radios[current_preset].setChecked(True)
+        if self.config_manager.get("save_png_palette", False):
+            self.radio_palette_yes.setChecked(True)
+        else:
+            self.radio_palette_no.setChecked(True)
+        if self.config_manager.get("webp_lossless", False):
+            self.radio_lossless_yes.setChecked(True)
+        else:
+            self.radio_lossless_no.setChecked(True)
+        self.workers_input.setValue(self.config_manager.get("process_workers", 0))
+        # 像素上限由调用方重建处理器时统一应用，不逐个修改旧处理器
+        self.max_pixels_input.blockSignals(True)
+        self.max_pixels_input.setValue(int(self.config_manager.get("max_image_megapixels", 100)))
+        self.max_pixels_input.blockSignals(False)
+        self.cache_folder_input.setText(self.config_manager.get("cell_cache_dir", ""))
+        if self.config_manager.get("fast_preview", True):
+            self.radio_fast_preview_yes.setChecked(True)
+        else:
+            self.radio_fast_preview_no.setChecked(True)
+        if self.config_manager.get("stage_timing_enabled", False):
+            self.radio_stage_timing_yes.setChecked(True)
+        else:
+            self.radio_stage_timing_no.setChecked(True)
+        
+        canvas_color = self.config_manager.get("canvas_background_color", "#000000")
+        self.canvas_color_input.setText(canvas_color)
+        self.canvas_color_preview.setStyleSheet(f"""
+            background-color: {canvas_color};
+            border: 1px solid #555555;
+            border-radius: 4px;
+        """)
+    
     def save_image(self):
         """保存图片"""
         if not self.processed_image:
@@ -1386,6 +2226,10 @@ class MainWindow(QMainWindow):
         output_folder = self.config_manager.get("output_image_folder", "")
         save_format = self.config_manager.get("save_format", "PNG")
         save_quality = self.config_manager.get("save_quality", 95)
+        save_preset = self.config_manager.get("save_preset", ImageProcessor.DEFAULT_SAVE_PRESET)
+        save_palette = self.config_manager.get("save_png_palette", False)
+        save_lossless = self.config_manager.get("webp_lossless", False)
+        ext = ImageProcessor.SAVE_EXTENSIONS.get(save_format, "png")
         
         file_path = None
         
@@ -1398,42 +2242,69 @@ class MainWindow(QMainWindow):
                     return
             
             filename_pattern = self.config_manager.get("filename_pattern", "timestamp")
-            ext = "png" if save_format == "PNG" else "jpg"
             
             if filename_pattern == "timestamp":
                 from datetime import datetime
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"wallpaper_{timestamp}.{ext}"
+                file_path = os.path.join(output_folder, filename)
             else:
-                existing_files = [f for f in os.listdir(output_folder) if f.startswith("wallpaper_") and f.endswith(f".{ext}")]
-                max_num = 0
-                for f in existing_files:
-                    try:
-                        num_part = f.replace("wallpaper_", "").replace(f".{ext}", "")
-                        if num_part.isdigit():
-                            max_num = max(max_num, int(num_part))
-                    except:
-                        pass
-                filename = f"wallpaper_{str(max_num + 1).zfill(3)}.{ext}"
-            
-            file_path = os.path.join(output_folder, filename)
+                # 编号从文件夹内的索引读取，并独占创建占位文件，后台保存中的文件也不会重号
+                try:
+                    file_path = SequenceIndex(output_folder).allocate(ext)
+                except OSError as e:
+                    QMessageBox.critical(self, "错误", f"无法分配文件名:\n{str(e)}")
+                    return
         else:
-            default_ext = "png" if save_format == "PNG" else "jpg"
             file_path, _ = QFileDialog.getSaveFileName(
                 self,
                 "保存图片",
-                os.path.join(output_folder, f"wallpaper.{default_ext}"),
-                "PNG 图片 (*.png);;JPG 图片 (*.jpg);;所有文件 (*.*)"
+                os.path.join(output_folder, f"wallpaper.{ext}"),
+                "PNG 图片 (*.png);;JPG 图片 (*.jpg);;WebP 图片 (*.webp);;所有文件 (*.*)"
             )
         
         if file_path:
-            try:
-                self.processor.save_result(self.processed_image, file_path, save_format, save_quality)
-                if silent_save:
-                    self.status_label.setText(f"已保存: {os.path.basename(file_path)}")
-                else:
-                    QMessageBox.information(self, "成功", f"图片已保存到:\n{file_path}")
-                    self.status_label.setText(f"已保存: {os.path.basename(file_path)}")
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"保存图片失败:\n{str(e)}")
+            image = self.processed_image
+            processor = self.processor
+            if self.full_render_source is not None:
+                # 预览只有显示分辨率，在保存线程中按处理时的图片和参数重新生成全分辨率结果
+                processor, image_paths, (rows, cols) = self.full_render_source
+                max_workers = self.config_manager.get("process_workers", 0)
+                image = lambda: processor.render_sheet(image_paths, rows, cols, max_workers)
+            self.save_worker.submit(
+                processor, image, file_path,
+                save_format, save_quality, save_preset, save_palette, save_lossless
+            )
+            self.update_save_status(f"正在保存: {os.path.basename(file_path)}")
+    
+    def update_save_status(self, message):
+        """
+        在状态栏显示保存进度，附带仍在后台保存的文件数
+        
+        @param message: 状态信息
+        """
+        pending = self.save_worker.pending_count()
+        if pending > 0:
+            message = f"{message}（后台保存中 {pending} 个）"
+        self.status_label.setText(message)
+    
+    def on_image_saved(self, file_path, elapsed):
+        """
+        后台保存完成
+        
+        @param file_path: 保存的文件路径
+        @param elapsed: 编码和写入耗时（秒）
+        """
+        self.update_save_status(f"已保存: {os.path.basename(file_path)} ({elapsed:.1f}s)")
+    
+    def on_image_save_failed(self, file_path, message):
+        """
+        后台保存失败
+        
+        @param file_path: 保存的文件路径
+        @param message: 错误信息
+        """
+        SequenceIndex.release(file_path)
+        self.update_save_status(f"保存失败: {os.path.basename(file_path)}")
+        QMessageBox.critical(self, "错误", f"保存图片失败:\n{file_path}\n{message}")
 
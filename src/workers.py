@@ -0,0 +1,280 @@
+"""
+后台任务模块
+
+提供基于 QThread 的图片处理工作线程，避免耗时操作阻塞界面
+"""
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import time
+from image_processor import PixelLimitError
+
+
+class ProcessWorker(QThread):
+    """图片处理工作线程，逐张处理并通过信号汇报进度"""
+    
+    progress = pyqtSignal(int, int)
+    draft_ready = pyqtSignal(int, object)
+    cell_ready = pyqtSignal(int, object)
+    result_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    
+    def __init__(self, processor, image_paths, layout, max_workers=1, parent=None, cached_cells=None,
+                 base_grid=None, changed_indices=None, draft_processor=None):
+        """
+        初始化图片处理工作线程
+        
+        @param processor: ImageProcessor 实例
+        @param image_paths: 待处理的图片路径列表
+        @param layout: 网格布局 (行数, 列数)
+        @param max_workers: 并行处理的线程数，0 表示使用全部 CPU 核心
+        @param parent: 父对象
+        @param cached_cells: 可选，与 image_paths 等长的已处理格子列表，为 None 的格子才重新处理
+        @param base_grid: 可选，上一次拼接的同布局网格图片，传入时只把 changed_indices 中的格子贴入其副本
+        @param changed_indices: 与 base_grid 相比内容有变化的格子序号集合
+        @param draft_processor: 可选，ImageProcessor.draft() 生成的草稿处理器，传入时每个待处理格子先快速生成
+                                草稿并通过 draft_ready 发出，再生成该格子的正式结果
+        """
+        super().__init__(parent)
+        self.processor = processor
+        self.image_paths = list(image_paths)
+        self.layout_grid = layout
+        self.max_workers = max_workers
+        self.cached_cells = list(cached_cells) if cached_cells is not None else [None] * len(self.image_paths)
+        self.base_grid = base_grid
+        self.changed_indices = changed_indices
+        self.draft_processor = draft_processor
+        self._cancel_requested = False
+        self._done_count = 0
+    
+    def cancel(self):
+        """请求取消当前任务，已开始的单张处理会在完成后停止"""
+        self._cancel_requested = True
+    
+    def is_cancelled(self):
+        """
+        是否已请求取消
+        
+        @return: 已请求取消返回 True
+        """
+        return self._cancel_requested
+    
+    def run(self):
+        """在工作线程中处理全部图片并按原顺序拼接结果"""
+        rows, cols = self.layout_grid
+        
+        self._done_count = 0
+        cells = list(self.cached_cells)
+        pending = [idx for idx, cell in enumerate(cells) if cell is None]
+        
+        try:
+            for idx, cell in enumerate(cells):
+                if cell is not None:
+                    self._on_cell_processed(idx, cell)
+            
+            processed_images = self.processor.process_batch(
+                [self.image_paths[idx] for idx in pending],
+                max_workers=self.max_workers,
+                on_result=lambda position, image: self._on_cell_processed(pending[position], image),
+                should_cancel=self.is_cancelled,
+                draft_processor=self.draft_processor,
+                on_draft=lambda position, image: self.draft_ready.emit(pending[position], image)
+            )
+            
+            if processed_images is None or self._cancel_requested:
+                self.cancelled.emit()
+                return
+            for idx, image in zip(pending, processed_images):
+                cells[idx] = image
+            
+            if rows == 1 and cols == 1:
+                result = cells[0]
+            elif self.base_grid is not None:
+                changed_cells = {idx: cells[idx] for idx in self.changed_indices}
+                result = self.processor.update_grid_layout(self.base_grid, changed_cells, cols)
+            else:
+                result = self.processor.create_grid_layout(cells, rows, cols)
+            
+            self.result_ready.emit(result)
+        
+        except Exception as e:
+            self.failed.emit(str(e))
+    
+    def _on_cell_processed(self, index, image):
+        """
+        单张图片处理完成的回调
+        
+        @param index: 图片序号
+        @param image: 处理后的 PIL Image 对象
+        """
+        self._done_count += 1
+        self.cell_ready.emit(index, image)
+        self.progress.emit(self._done_count, len(self.image_paths))
+
+
+class ThumbnailWorker(QThread):
+    """缩略图生成工作线程"""
+    
+    thumbnail_ready = pyqtSignal(int, str, object, tuple)
+    thumbnail_failed = pyqtSignal(int, str, str)
+    
+    def __init__(self, thumbnail_cache, image_paths, size, generation, parent=None):
+        """
+        初始化缩略图生成工作线程
+        
+        @param thumbnail_cache: ThumbnailCache 实例
+        @param image_paths: 原图路径列表
+        @param size: 缩略图最大尺寸 (宽, 高)
+        @param generation: 生成批次，用于界面丢弃过期结果
+        @param parent: 父对象
+        """
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.image_paths = list(image_paths)
+        self.size = size
+        self.generation = generation
+        self._cancel_requested = False
+    
+    def cancel(self):
+        """请求取消，当前缩略图完成后停止"""
+        self._cancel_requested = True
+    
+    def run(self):
+        """逐张生成缩略图"""
+        for image_path in self.image_paths:
+            if self._cancel_requested:
+                return
+            try:
+                thumbnail = self.thumbnail_cache.get(image_path, self.size)
+                self.thumbnail_ready.emit(self.generation, image_path, thumbnail, self.size)
+            except Exception as e:
+                self.thumbnail_failed.emit(self.generation, image_path, str(e))
+
+
+class ProbeWorker(QThread):
+    """
+    上传校验工作线程
+    
+    在线程池中并发读取图片文件头，按提交顺序逐个汇报结果，界面可以边校验边添加
+    """
+    
+    PROBE_WORKERS = 8
+    
+    probed = pyqtSignal(int, str, object)
+    probe_failed = pyqtSignal(int, str, str, bool)
+    
+    def __init__(self, processor, image_paths, generation, parent=None):
+        """
+        初始化上传校验工作线程
+        
+        @param processor: 提供 probe_image 的 ImageProcessor 实例
+        @param image_paths: 待校验的图片路径列表
+        @param generation: 校验批次，用于界面丢弃清空列表之前的结果
+        @param parent: 父对象
+        """
+        super().__init__(parent)
+        self.processor = processor
+        self.image_paths = list(image_paths)
+        self.generation = generation
+        self._cancel_requested = False
+    
+    def cancel(self):
+        """请求取消，尚未开始的校验不再执行"""
+        self._cancel_requested = True
+    
+    def run(self):
+        """并发校验全部图片，按原顺序发出结果"""
+        # 读文件头以 I/O 为主，线程数不受 CPU 核心数限制
+        workers = min(self.PROBE_WORKERS, len(self.image_paths))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.processor.probe_image, path) for path in self.image_paths]
+            try:
+                for image_path, future in zip(self.image_paths, futures):
+                    if self._cancel_requested:
+                        return
+                    try:
+                        info = future.result()
+                    except Exception as e:
+                        too_large = isinstance(e, PixelLimitError)
+                        self.probe_failed.emit(self.generation, image_path, str(e), too_large)
+                    else:
+                        self.probed.emit(self.generation, image_path, info)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+class SaveWorker(QThread):
+    """
+    后台保存线程
+    
+    保存任务进入队列后按提交顺序依次编码写出，界面线程只负责提交，可以同时有多个保存任务排队
+    """
+    
+    saved = pyqtSignal(str, float)
+    save_failed = pyqtSignal(str, str)
+    
+    def __init__(self, parent=None):
+        """
+        初始化后台保存线程
+        
+        @param parent: 父对象
+        """
+        super().__init__(parent)
+        self._jobs = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    def submit(self, processor, image, output_path, *save_args):
+        """
+        提交保存任务，线程未运行时自动启动
+        
+        @param processor: 用于编码的 ImageProcessor 实例
+        @param image: 要保存的 PIL Image 对象，提交后不应再修改；也可以是无参可调用对象，
+                      在后台线程中调用它生成要保存的图片（如预览模式下的全分辨率渲染）
+        @param output_path: 输出文件路径
+        @param save_args: 依次传给 ImageProcessor.save_result 的格式、质量等参数
+        """
+        with self._lock:
+            self._pending += 1
+        self._jobs.put((processor, image, output_path, save_args))
+        if not self.isRunning():
+            self.start()
+    
+    def pending_count(self):
+        """
+        获取尚未完成的保存任务数
+        
+        @return: 排队中和正在保存的任务数
+        """
+        with self._lock:
+            return self._pending
+    
+    def finish(self):
+        """请求线程在完成已提交的全部任务后退出"""
+        self._jobs.put(None)
+    
+    def run(self):
+        """依次处理队列中的保存任务"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            processor, image, output_path, save_args = job
+            start_time = time.perf_counter()
+            try:
+                if callable(image):
+                    image = image()
+                processor.save_result(image, output_path, *save_args)
+                error = None
+            except Exception as e:
+                error = str(e)
+            with self._lock:
+                self._pending -= 1
+            if error is None:
+                self.saved.emit(output_path, time.perf_counter() - start_time)
+            else:
+                self.save_failed.emit(output_path, error)